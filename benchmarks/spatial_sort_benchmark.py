@@ -0,0 +1,86 @@
+"""
+Measures the effect of the Z-order sorting of the splats on the downstream stages.
+
+Usage: python benchmarks/spatial_sort_benchmark.py <gaussian point cloud> [--voxel-size 0.05] [--repeats 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import open3d as o3d
+import torch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from src.utils.file_loader import load_gaussian_model
+from src.utils.point_cloud_converter import convert_gs_to_open3d_pc
+
+# Number of points the nearest neighbors are queried for
+KNN_QUERY_COUNT = 100000
+KNN_NEIGHBOR_COUNT = 30
+
+
+def measure(function, repeats):
+    """Returns the best wall clock time of the repeated calls, in seconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def query_neighbors(point_cloud):
+    tree = o3d.geometry.KDTreeFlann(point_cloud)
+    points = np.asarray(point_cloud.points)
+    # Consecutive queries, as in the normal estimation and the plane fitting
+    for point in points[:min(KNN_QUERY_COUNT, points.shape[0])]:
+        tree.search_knn_vector_3d(point, KNN_NEIGHBOR_COUNT)
+
+
+def run_stages(gaussian, voxel_size, repeats):
+    point_cloud = convert_gs_to_open3d_pc(gaussian)
+    return {
+        "Open3D conversion": measure(lambda: convert_gs_to_open3d_pc(gaussian), repeats),
+        "Voxel downsampling": measure(lambda: point_cloud.voxel_down_sample(voxel_size), repeats),
+        "KD-tree build": measure(lambda: o3d.geometry.KDTreeFlann(point_cloud), repeats),
+        "KNN queries": measure(lambda: query_neighbors(point_cloud), repeats),
+        "Normal estimation": measure(lambda: point_cloud.estimate_normals(), repeats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--voxel-size", type=float, default=0.05)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    gaussian = load_gaussian_model(args.path)
+    if gaussian is None:
+        print(f"{args.path} is not a Gaussian point cloud.")
+        return
+
+    # The shuffled copy shows the worst case, independently of how the trainer happened to write the file
+    shuffled = gaussian.clone_gaussian()
+    shuffled.reorder(torch.randperm(shuffled.get_xyz.shape[0], generator=torch.Generator().manual_seed(0)))
+
+    start = time.perf_counter()
+    sorted_gaussian = gaussian.clone_gaussian()
+    sorted_gaussian.sort_spatially()
+    print(f"{gaussian.get_xyz.shape[0]} splats, sorting took {time.perf_counter() - start:.3f} s")
+
+    results = {"File order": run_stages(gaussian, args.voxel_size, args.repeats),
+               "Shuffled": run_stages(shuffled, args.voxel_size, args.repeats),
+               "Z-order": run_stages(sorted_gaussian, args.voxel_size, args.repeats)}
+
+    print(f"{'Stage':<20}" + "".join(f"{name:>14}" for name in results))
+    for stage in results["File order"]:
+        print(f"{stage:<20}" + "".join(f"{timings[stage]:>13.3f}s" for timings in results.values()))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,16 @@
+import bisect
+
 from PySide6.QtCore import Signal
 
 from controllers.base_controller import BaseController
 from gui.widgets.progress_dialog_factory import ProgressDialogFactory
 from gui.workers.downsampling.qt_gaussian_mixture import GaussianMixtureWorker
+from gui.workers.downsampling.qt_lod_builder import LodBuilderWorker
 from gui.workers.downsampling.qt_plane_merging import PlaneInlierMergingWorker
 from gui.workers.qt_base_worker import move_worker_to_thread
 from models.data_repository import DataRepository
 from models.ui_state_repository import UIStateRepository
-from params.merge_parameters import GaussianMixtureParams
+from params.merge_parameters import GaussianMixtureParams, LodParams
 
 
 class DownsamplerController(BaseController):
@@ -16,6 +19,12 @@ class DownsamplerController(BaseController):
     def __init__(self, data_repository: DataRepository, ui_repository: UIStateRepository):
         super().__init__(data_repository, ui_repository)
 
+        # Levels of the mixture in progress that are in the repository, in the order of the lists
+        self.streamed_levels = []
+        # Progress of the mixture creation. It is shown without a nested event loop, so the streamed levels are
+        # displayed while the others are converted. It stays modal, no other action may replace the lists meanwhile.
+        self.mixture_progress_dialog = None
+
     # region Event handlers
     def create_mixture(self, params: GaussianMixtureParams):
         pc1 = pc2 = None
@@ -33,6 +42,38 @@ class DownsamplerController(BaseController):
         progress_dialog = ProgressDialogFactory.get_progress_dialog("Loading", "Creating Gaussian mixtures...")
         worker = GaussianMixtureWorker(pc1, pc2, params.hem_reduction, params.distance_delta,
                                        params.color_delta, params.decay_rate, params.cluster_level)
+        self.streamed_levels = []
+        worker.signal_level_result.connect(self.handle_mixture_level_result)
+        thread = move_worker_to_thread(self, worker, self.handle_mixture_stream_finished,
+                                       self.throw_list_error, progress_dialog.setValue)
+        progress_dialog.canceled.connect(worker.cancel)
+        worker.signal_finished.connect(self.close_mixture_progress_dialog)
+        self.mixture_progress_dialog = progress_dialog
+
+        thread.start()
+        progress_dialog.show()
+
+    def create_lod_levels(self, params: LodParams):
+        pc1 = pc2 = None
+
+        if len(self.data_repository.pc_gaussian_list_first) != 0:
+            pc1 = self.data_repository.pc_gaussian_list_first[0]
+        if len(self.data_repository.pc_gaussian_list_second) != 0:
+            pc2 = self.data_repository.pc_gaussian_list_second[0]
+
+        if not pc1 or not pc2:
+            self.signal_single_error.emit("There are no gaussian point clouds loaded! "
+                                          "Please load two point clouds to create levels of detail.")
+            return
+
+        if not params.is_valid():
+            self.signal_single_error.emit("The reduction factor must be greater than 1 and "
+                                          "there must be at least one level of detail!")
+            return
+
+        progress_dialog = ProgressDialogFactory.get_progress_dialog("Loading", "Creating levels of detail...")
+        worker = LodBuilderWorker(pc1, pc2, params)
+        # The levels replace the mixtures in the repository, so they are handled the same way
         thread = move_worker_to_thread(self, worker, self.handle_mixture_results,
                                        progress_handler=progress_dialog.setValue)
         progress_dialog.canceled.connect(worker.cancel)
@@ -72,19 +113,52 @@ class DownsamplerController(BaseController):
 
     # region Result handlers
     def handle_mixture_results(self, result_data):
+        self.remove_mixture_levels()
 
-        if len(self.data_repository.pc_gaussian_list_first) > 1:
-            self.data_repository.pc_gaussian_list_first = self.data_repository.pc_gaussian_list_first[:1]
-            self.data_repository.pc_gaussian_list_second = self.data_repository.pc_gaussian_list_second[:1]
-            self.data_repository.pc_open3d_list_first = self.data_repository.pc_open3d_list_first[:1]
-            self.data_repository.pc_open3d_list_second = self.data_repository.pc_open3d_list_second[:1]
-
-        self.data_repository.pc_open3d_list_first.extend(result_data.list_open3d_first)
-        self.data_repository.pc_open3d_list_second.extend(result_data.list_open3d_second)
         self.data_repository.pc_gaussian_list_first.extend(result_data.list_gaussian_first)
         self.data_repository.pc_gaussian_list_second.extend(result_data.list_gaussian_second)
+        # The Open3D point clouds are converted from the Gaussian ones when they are displayed or registered
+        self.data_repository.pc_open3d_list_first.extend([None] * len(result_data.list_gaussian_first))
+        self.data_repository.pc_open3d_list_second.extend([None] * len(result_data.list_gaussian_second))
+
+        self.signal_update_hem_slider.emit(len(self.data_repository.pc_open3d_list_first) - 1)
+        self.signal_success_message.emit("Levels of detail", f"{len(result_data.list_gaussian_first)} levels "
+                                         "were created.", self.data_repository.get_memory_summary())
+
+    def handle_mixture_level_result(self, level_result: GaussianMixtureWorker.LevelResultData):
+        # The previous levels are only removed once the first new one arrives, so a cancelled run keeps them
+        if not self.streamed_levels:
+            self.remove_mixture_levels()
+
+        # The levels arrive in any order, they are inserted after the original point clouds by their level
+        position = bisect.bisect(self.streamed_levels, level_result.level)
+        self.streamed_levels.insert(position, level_result.level)
+        self.data_repository.pc_gaussian_list_first.insert(position + 1, level_result.gaussian_first)
+        self.data_repository.pc_gaussian_list_second.insert(position + 1, level_result.gaussian_second)
+        self.data_repository.pc_open3d_list_first.insert(position + 1, None)
+        self.data_repository.pc_open3d_list_second.insert(position + 1, None)
+
+        self.signal_update_hem_slider.emit(len(self.data_repository.pc_open3d_list_first) - 1)
+
+    def handle_mixture_stream_finished(self, result_data: GaussianMixtureWorker.ResultData):
+        self.streamed_levels = []
 
         self.signal_update_hem_slider.emit(len(self.data_repository.pc_open3d_list_first) - 1)
+        if result_data.level_count > 0:
+            self.signal_success_message.emit("Gaussian mixtures", f"{result_data.level_count} mixture levels "
+                                             "were created.", self.data_repository.get_memory_summary())
+
+    def close_mixture_progress_dialog(self):
+        if self.mixture_progress_dialog is not None:
+            self.mixture_progress_dialog.close()
+            self.mixture_progress_dialog = None
+
+    def remove_mixture_levels(self):
+        # The levels are deleted without accessing them, so they are neither reloaded nor converted
+        del self.data_repository.pc_gaussian_list_first[1:]
+        del self.data_repository.pc_gaussian_list_second[1:]
+        del self.data_repository.pc_open3d_list_first[1:]
+        del self.data_repository.pc_open3d_list_second[1:]
 
     def handle_plane_merge_results(self, result_data: PlaneInlierMergingWorker.ResultData):
         self.data_repository.first_plane_indices.clear()
@@ -1,14 +1,10 @@
-import copy
-
-import numpy as np
-import torch
-
 from controllers.base_controller import BaseController
 from gui.workers.downsampling.qt_plane_fitting import PlaneFittingWorker
 from models.data_repository import DataRepository
 from models.ui_state_repository import UIStateRepository
 from params.plane_fitting_params import PlaneFittingParams
 from utils.plane_fitting_util import get_o3d_plane
+from utils.point_cloud_converter import transform_tensor_pc, to_torch_tensor
 
 
 class PlaneFittingController(BaseController):
@@ -17,9 +13,8 @@ class PlaneFittingController(BaseController):
 
     # region Event handlers
     def fit_plane(self, params: PlaneFittingParams):
-        pc1 = copy.deepcopy(self.data_repository.pc_open3d_list_first[0])
-        pc2 = self.data_repository.pc_open3d_list_second[0]
-        pc1.transform(self.ui_repository.transformation_matrix)
+        pc1, pc2 = self.data_repository.get_tensor_point_clouds(0)
+        pc1 = transform_tensor_pc(pc1, self.ui_repository.transformation_matrix)
 
         worker = PlaneFittingWorker(pc1, pc2, params.plane_count, params.iteration,
                                     params.distance_threshold, params.normal_threshold, params.min_distance)
@@ -38,12 +33,11 @@ class PlaneFittingController(BaseController):
 
     # region Result handlers
     def handle_fit_plane_result(self, result_data: PlaneFittingWorker.ResultData):
-        pc1 = copy.deepcopy(self.data_repository.pc_open3d_list_first[0])
-        pc2 = self.data_repository.pc_open3d_list_second[0]
-        pc1.transform(self.ui_repository.transformation_matrix)
+        pc1, pc2 = self.data_repository.get_tensor_point_clouds(0, estimate_normals=False)
+        pc1 = transform_tensor_pc(pc1, self.ui_repository.transformation_matrix)
 
-        points_tensor1 = torch.from_numpy(np.array(pc1.points, dtype=np.float32))
-        points_tensor2 = torch.from_numpy(np.array(pc2.points, dtype=np.float32))
+        points_tensor1 = to_torch_tensor(pc1.point.positions).cpu()
+        points_tensor2 = to_torch_tensor(pc2.point.positions).cpu()
 
         planes = []
         for i in range(len(result_data.coefficients_pc1)):
@@ -20,7 +20,8 @@ class PointCloudIOController(BaseController):
     # region Event handlers
     def handle_sparse_load(self, params: LoadRequestParams):
         progress_dialog = ProgressDialogFactory.get_progress_dialog("Loading", "Loading point clouds...")
-        worker = PointCloudLoaderInput(params.first_path, params.second_path)
+        worker = PointCloudLoaderInput(params.first_path, params.second_path, params.stream_large_files,
+                                       params.stream_stride, params.stream_voxel_size)
         thread = move_worker_to_thread(self, worker, self.handle_result_sparse,
                                        progress_handler=progress_dialog.setValue)
         thread.start()
@@ -28,9 +29,13 @@ class PointCloudIOController(BaseController):
 
     def handle_gaussian_load(self, params: LoadRequestParams):
         progress_dialog = ProgressDialogFactory.get_progress_dialog("Loading", "Loading point clouds...")
-        worker = PointCloudLoaderGaussian(params.first_path, params.second_path)
+        worker = PointCloudLoaderGaussian(params.first_path, params.second_path, params.lazy_load,
+                                          params.spatial_sort, params.normal_estimation, params.registration_only,
+                                          params.stream_stride, params.stream_voxel_size, params.stream_min_opacity,
+                                          params.normal_orientation)
         thread = move_worker_to_thread(self, worker,
-                                       lambda result: self.handle_result_gaussian(result, params.save_converted),
+                                       lambda result: self.handle_result_gaussian(result, params.save_converted,
+                                                                                  params.normal_estimation),
                                        progress_handler=progress_dialog.setValue,
                                        error_handler=self.throw_single_error)
         thread.start()
@@ -85,11 +90,17 @@ class PointCloudIOController(BaseController):
     def handle_result_sparse(self, sparse_result: PointCloudLoaderInput.ResultData):
         self.handle_result_base(sparse_result.point_cloud_first, sparse_result.point_cloud_second)
 
-    def handle_result_gaussian(self, gaussian_result: PointCloudLoaderGaussian.ResultData, save_o3d_point_clouds):
-        if gaussian_result.gaussian_point_cloud_first.sh_degree != gaussian_result.gaussian_point_cloud_second.sh_degree:
+    def handle_result_gaussian(self, gaussian_result: PointCloudLoaderGaussian.ResultData, save_o3d_point_clouds,
+                               normal_estimation):
+        gaussian_first = gaussian_result.gaussian_point_cloud_first
+        gaussian_second = gaussian_result.gaussian_point_cloud_second
+        # Registration-only loads have no Gaussian models
+        if (gaussian_first is not None and gaussian_second is not None
+                and gaussian_first.sh_degree != gaussian_second.sh_degree):
             self.throw_single_error("The selected point clouds have different sh degrees.")
             return
 
+        self.data_repository.normal_estimation = normal_estimation
         self.handle_result_base(gaussian_result.o3d_point_cloud_first, gaussian_result.o3d_point_cloud_second,
                                 gaussian_result.gaussian_point_cloud_first,
                                 gaussian_result.gaussian_point_cloud_second)
@@ -111,13 +122,15 @@ class PointCloudIOController(BaseController):
     def __get_merge_worker(self, params: SaveRequestParams):
         if params.use_corresponding_pc:
             return GaussianSaverUseCorresponding(params.first_path, params.second_path,
-                                                 params.transformation_matrix, params.save_path)
+                                                 params.transformation_matrix, params.save_path,
+                                                 params.sh_quantization)
 
         if self.data_repository.pc_gaussian_list_first and self.data_repository.pc_gaussian_list_second:
             index = self.data_repository.current_index
             pc_first, pc_second = (self.data_repository.pc_gaussian_list_first[index],
                                    self.data_repository.pc_gaussian_list_second[index])
-            return GaussianSaverNormal(pc_first, pc_second, params.transformation_matrix, params.save_path)
+            return GaussianSaverNormal(pc_first, pc_second, params.transformation_matrix, params.save_path,
+                                       params.sh_quantization)
 
         self.throw_single_error(
             "There were no preloaded point clouds found! Load a Gaussian point cloud before merging, "
@@ -13,6 +13,8 @@ from gui.workers.registration.qt_ransac_registrator import RANSACRegistrator
 from models.data_repository import DataRepository
 from models.ui_state_repository import UIStateRepository
 from params.registration_parameters import LocalRegistrationParams, FGRRegistrationParams, RANSACRegistrationParams
+from utils.local_registration_util import uses_tensor_backend, requires_normals
+from utils.point_cloud_converter import select_tensor_pc
 
 
 class RegistrationController(BaseController):
@@ -22,16 +24,25 @@ class RegistrationController(BaseController):
 
     # region Event handlers
     def execute_local_registration_normal(self, params: LocalRegistrationParams):
-        pc1 = self.data_repository.pc_open3d_list_first[self.data_repository.current_index]
-        pc2 = self.data_repository.pc_open3d_list_second[self.data_repository.current_index]
+        if uses_tensor_backend(params):
+            pc1, pc2 = self.data_repository.get_tensor_point_clouds(self.data_repository.current_index,
+                                                                    requires_normals(params.registration_type))
+        else:
+            pc1 = self.data_repository.pc_open3d_list_first[self.data_repository.current_index]
+            pc2 = self.data_repository.pc_open3d_list_second[self.data_repository.current_index]
 
         self._execute_local_registration(pc1, pc2, params)
 
     def execute_local_registration_inlier(self, params: LocalRegistrationParams):
         first_inlier_indices = np.concatenate(self.data_repository.first_plane_indices).tolist()
         second_inlier_indices = np.concatenate(self.data_repository.second_plane_indices).tolist()
-        pc1 = self.data_repository.pc_open3d_list_first[0].select_by_index(first_inlier_indices)
-        pc2 = self.data_repository.pc_open3d_list_second[0].select_by_index(second_inlier_indices)
+        if uses_tensor_backend(params):
+            pc1, pc2 = self.data_repository.get_tensor_point_clouds(0, requires_normals(params.registration_type))
+            pc1 = select_tensor_pc(pc1, first_inlier_indices)
+            pc2 = select_tensor_pc(pc2, second_inlier_indices)
+        else:
+            pc1 = self.data_repository.pc_open3d_list_first[0].select_by_index(first_inlier_indices)
+            pc2 = self.data_repository.pc_open3d_list_second[0].select_by_index(second_inlier_indices)
 
         self._execute_local_registration(pc1, pc2, params)
 
@@ -97,6 +108,9 @@ class RegistrationController(BaseController):
         if use_mixture:
             pc1_list = self.data_repository.pc_open3d_list_first
             pc2_list = self.data_repository.pc_open3d_list_second
+            # Every level is registered, so the conversions are kept during the run
+            open3d_cache = self.data_repository.open3d_cache
+            previous_cache_size = open3d_cache.reserve(len(pc1_list) + len(pc2_list))
             worker = MultiScaleRegistratorMixture(pc1_list, pc2_list,
                                                   self.ui_repository.transformation_matrix,
                                                   use_corresponding, sparse_first, sparse_second,
@@ -116,6 +130,8 @@ class RegistrationController(BaseController):
         thread = move_worker_to_thread(self, worker, self.handle_registration_result_local,
                                        self.signal_single_error.emit,
                                        progress_dialog.setValue)
+        if use_mixture:
+            thread.finished.connect(lambda: open3d_cache.resize(previous_cache_size))
         thread.start()
         progress_dialog.exec()
 
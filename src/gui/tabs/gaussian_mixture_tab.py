@@ -2,13 +2,14 @@ from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QDoubleValidator, QIntValidator
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QGroupBox, QFormLayout, QSlider, QLabel
 
-from params.merge_parameters import GaussianMixtureParams
+from params.merge_parameters import GaussianMixtureParams, LodParams
 from src.gui.widgets.custom_push_button import CustomPushButton
 from src.gui.widgets.simple_input_field_widget import SimpleInputField
 
 
 class GaussianMixtureTab(QWidget):
     signal_create_mixture = Signal(GaussianMixtureParams)
+    signal_create_lod = Signal(LodParams)
     signal_slider_changed = Signal(int)
 
     def __init__(self, with_slider=True):
@@ -59,6 +60,25 @@ class GaussianMixtureTab(QWidget):
 
         layout.addWidget(widget_options)
         layout.addWidget(bt_apply)
+
+        if self.with_slider:
+            # The levels of detail are subsets of the splats, they are a quick alternative to the mixtures
+            widget_lod = QGroupBox("Levels of detail")
+            layout_lod = QFormLayout(widget_lod)
+
+            lod_params = LodParams()
+            self.lod_reduction_field = SimpleInputField(str(lod_params.reduction_factor), validator=double_validator)
+            self.lod_level_field = SimpleInputField(str(lod_params.level_count), validator=int_validator)
+            layout_lod.addRow("Reduction factor:", self.lod_reduction_field)
+            layout_lod.addRow("Number of levels:", self.lod_level_field)
+
+            bt_lod = CustomPushButton("Create levels", 100)
+            bt_lod.connect_to_clicked(self.lod_execute_button_pressed)
+
+            layout.addSpacing(20)
+            layout.addWidget(widget_lod)
+            layout.addWidget(bt_lod)
+
         layout.addStretch()
 
         bt_apply.connect_to_clicked(self.hem_execute_button_pressed)
@@ -73,6 +93,12 @@ class GaussianMixtureTab(QWidget):
         self.signal_create_mixture.emit(GaussianMixtureParams(hem_reduction, distance_delta,
                                                               color_delta, decay_rate, cluster_level))
 
+    def lod_execute_button_pressed(self):
+        reduction_factor = float(self.lod_reduction_field.lineedit.text())
+        level_count = int(self.lod_level_field.lineedit.text())
+
+        self.signal_create_lod.emit(LodParams(reduction_factor, level_count))
+
     def update_hem_slider(self, value):
         if self.with_slider:
             self.set_slider_enabled(value != 0)
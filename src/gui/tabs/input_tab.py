@@ -1,10 +1,14 @@
 from PySide6.QtCore import Signal
-from PySide6.QtWidgets import QCheckBox, QGroupBox, QFormLayout
+from PySide6.QtGui import QDoubleValidator, QIntValidator
+from PySide6.QtWidgets import QCheckBox, QGroupBox, QFormLayout, QComboBox, QSizePolicy
 from PySide6.QtWidgets import QWidget, QLabel, QVBoxLayout
 
 from params.io_parameters import LoadRequestParams
 from src.gui.widgets.custom_push_button import CustomPushButton
 from src.gui.widgets.file_selector_widget import FileSelector
+from src.gui.widgets.simple_input_field_widget import SimpleInputField
+from src.utils.file_loader import probe_point_cloud
+from src.utils.point_cloud_converter import NormalEstimationType, NormalOrientationType
 
 
 class InputTab(QWidget):
@@ -26,15 +30,30 @@ class InputTab(QWidget):
             }"""
         )
 
+        default_params = LoadRequestParams("", "")
         sparse_group_widget = QGroupBox("Sparse inputs")
         layout_sparse_form = QFormLayout(sparse_group_widget)
         self.fs_input1 = FileSelector()
         self.fs_input2 = FileSelector()
         bt_sparse = CustomPushButton("Import sparse point clouds", 90)
+        checkbox_stream = QCheckBox()
+        checkbox_stream.setChecked(default_params.stream_large_files)
         layout_sparse_form.addRow("First sparse input:", self.fs_input1)
         layout_sparse_form.addRow("Second sparse input:", self.fs_input2)
+        layout_sparse_form.addRow("Stream large files:", checkbox_stream)
         layout_sparse_form.addRow(bt_sparse)
 
+        streaming_group_widget = QGroupBox("Streamed loading")
+        layout_streaming_form = QFormLayout(streaming_group_widget)
+        self.stride_field = SimpleInputField(str(default_params.stream_stride), validator=QIntValidator(1, 9999))
+        self.voxel_size_field = SimpleInputField(str(default_params.stream_voxel_size),
+                                                 validator=QDoubleValidator(0.0, 9999.0, 10))
+        self.min_opacity_field = SimpleInputField(str(default_params.stream_min_opacity),
+                                                  validator=QDoubleValidator(0.0, 1.0, 10))
+        layout_streaming_form.addRow("Keep every n-th point:", self.stride_field)
+        layout_streaming_form.addRow("Voxel size:", self.voxel_size_field)
+        layout_streaming_form.addRow("Minimum opacity:", self.min_opacity_field)
+
         box_widget_cache = QGroupBox("Cached inputs")
         layout_cache = QFormLayout(box_widget_cache)
         self.fs_cache1 = FileSelector()
@@ -50,25 +69,74 @@ class InputTab(QWidget):
         self.fs_pc2 = FileSelector()
         bt_gaussian = CustomPushButton("Import gaussian point clouds", 90)
         checkbox_cache = QCheckBox()
+        checkbox_lazy = QCheckBox()
+        checkbox_sort = QCheckBox()
+        checkbox_registration = QCheckBox()
+        combo_box_normals = QComboBox()
+        combo_box_normals.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
+        for enum_member in NormalEstimationType:
+            combo_box_normals.addItem(enum_member.instance_name)
+        combo_box_orientation = QComboBox()
+        combo_box_orientation.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
+        for enum_member in NormalOrientationType:
+            combo_box_orientation.addItem(enum_member.instance_name)
+        label_pc1_info = QLabel()
+        label_pc2_info = QLabel()
 
         layout_input_form.addRow("First point cloud:", self.fs_pc1)
+        layout_input_form.addRow(label_pc1_info)
         layout_input_form.addRow("Second point cloud:", self.fs_pc2)
+        layout_input_form.addRow(label_pc2_info)
         layout_input_form.addRow("Save converted point clouds:", checkbox_cache)
+        layout_input_form.addRow("Load attributes on demand:", checkbox_lazy)
+        layout_input_form.addRow("Sort splats spatially:", checkbox_sort)
+        layout_input_form.addRow("Normals:", combo_box_normals)
+        layout_input_form.addRow("Normal orientation:", combo_box_orientation)
+        layout_input_form.addRow("Stream for registration only:", checkbox_registration)
         layout_input_form.addRow(bt_gaussian)
 
         layout_main.addWidget(label_io)
         layout_main.addWidget(sparse_group_widget)
         layout_main.addWidget(box_widget_cache)
         layout_main.addWidget(input_group_widget)
+        layout_main.addWidget(streaming_group_widget)
         layout_main.addStretch()
 
+        self.fs_pc1.inputField.textChanged.connect(lambda path: self.update_point_cloud_info(label_pc1_info, path))
+        self.fs_pc2.inputField.textChanged.connect(lambda path: self.update_point_cloud_info(label_pc2_info, path))
+
         bt_sparse.connect_to_clicked(lambda: self.signal_load_sparse.
                                      emit(LoadRequestParams(self.fs_input1.file_path,
-                                                            self.fs_input2.file_path)))
+                                                            self.fs_input2.file_path,
+                                                            stream_large_files=checkbox_stream.isChecked(),
+                                                            stream_stride=int(self.stride_field.text()),
+                                                            stream_voxel_size=float(self.voxel_size_field.text()))))
         bt_cached.connect_to_clicked(lambda: self.signal_load_cached
                                      .emit(LoadRequestParams(self.fs_cache1.file_path,
                                                              self.fs_cache2.file_path)))
         bt_gaussian.connect_to_clicked(lambda: self.signal_load_gaussian
                                        .emit(LoadRequestParams(self.fs_pc1.file_path,
                                                                self.fs_pc2.file_path,
-                                                               checkbox_cache.isChecked())))
+                                                               checkbox_cache.isChecked(),
+                                                               checkbox_lazy.isChecked(),
+                                                               checkbox_sort.isChecked(),
+                                                               NormalEstimationType(
+                                                                   combo_box_normals.currentIndex()),
+                                                               stream_stride=int(self.stride_field.text()),
+                                                               stream_voxel_size=float(self.voxel_size_field.text()),
+                                                               stream_min_opacity=float(self.min_opacity_field.text()),
+                                                               registration_only=checkbox_registration.isChecked(),
+                                                               normal_orientation=NormalOrientationType(
+                                                                   combo_box_orientation.currentIndex()))))
+
+    @staticmethod
+    def update_point_cloud_info(label, path):
+        probe = probe_point_cloud(path)
+        if probe is None:
+            label.setText("")
+            return
+
+        text = f"{probe.point_cloud_type.name.capitalize()}, {probe.vertex_count:,} points"
+        if probe.sh_degree >= 0:
+            text += f", SH degree {probe.sh_degree}"
+        label.setText(text)
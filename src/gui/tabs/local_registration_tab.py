@@ -6,7 +6,7 @@ from PySide6.QtWidgets import QWidget, QVBoxLayout, QSizePolicy, \
 from params.registration_parameters import LocalRegistrationParams
 from src.gui.widgets.custom_push_button import CustomPushButton
 from src.gui.widgets.simple_input_field_widget import SimpleInputField
-from src.utils.local_registration_util import LocalRegistrationType, KernelLossFunctionType
+from src.utils.local_registration_util import LocalRegistrationType, KernelLossFunctionType, LocalRegistrationBackend
 
 
 class LocalRegistrationTab(QWidget):
@@ -38,10 +38,22 @@ class LocalRegistrationTab(QWidget):
         # Max correspondence
         self.correspondence_widget = SimpleInputField(str(params.max_correspondence), 60, double_validator)
 
+        # Number of scales of the multi-scale ICP, only used by the tensor backend
+        self.scale_count_widget = SimpleInputField(str(params.scale_count), 60, int_validator)
+        self.scale_count_widget.setEnabled(params.backend is LocalRegistrationBackend.Tensor)
+        self.combo_box_backend = QComboBox()
+        self.combo_box_backend.currentIndexChanged.connect(self.backend_changed)
+        self.combo_box_backend.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
+        for enum_member in LocalRegistrationBackend:
+            self.combo_box_backend.addItem(enum_member.instance_name)
+        self.combo_box_backend.setCurrentIndex(params.backend.value)
+
         widget_local = QGroupBox()
         layout_local = QFormLayout(widget_local)
         layout_local.addRow("Local registration type:", self.combo_box_icp)
         layout_local.addRow("Max correspondence:", self.correspondence_widget)
+        layout_local.addRow("Backend:", self.combo_box_backend)
+        layout_local.addRow("Scale count:", self.scale_count_widget)
 
         # Relative fitness
         convergence_widget = QGroupBox("Convergence criteria")
@@ -107,9 +119,14 @@ class LocalRegistrationTab(QWidget):
         max_iteration = int(self.iteration_widget.lineedit.text())
         rejection_type = KernelLossFunctionType(self.combo_box_outlier.currentIndex())
         k_value = float(self.k_value_widget.lineedit.text())
+        backend = LocalRegistrationBackend(self.combo_box_backend.currentIndex())
+        scale_count = int(self.scale_count_widget.lineedit.text())
         params = LocalRegistrationParams(registration_type, max_correspondence, relative_fitness, relative_rmse,
-                                         max_iteration, rejection_type, k_value)
+                                         max_iteration, rejection_type, k_value, backend, scale_count)
         self.signal_do_registration.emit(params)
 
     def rejection_type_changed(self, index):
         self.k_value_widget.setEnabled(index != 0)
+
+    def backend_changed(self, index):
+        self.scale_count_widget.setEnabled(LocalRegistrationBackend(index) is LocalRegistrationBackend.Tensor)
@@ -1,11 +1,12 @@
 from PySide6 import QtCore
 from PySide6.QtWidgets import QWidget, QLabel, QVBoxLayout, QErrorMessage, \
-    QFileDialog, QGroupBox, QFormLayout, QHBoxLayout
+    QFileDialog, QGroupBox, QFormLayout, QHBoxLayout, QComboBox, QSizePolicy
 
 from models.ui_state_repository import UIStateRepository
 from params.io_parameters import SaveRequestParams
 from src.gui.widgets.custom_push_button import CustomPushButton
 from src.gui.widgets.file_selector_widget import FileSelector
+from src.models.compact_gaussian_model import SHQuantizationType
 
 
 class MergeTab(QWidget):
@@ -43,12 +44,23 @@ class MergeTab(QWidget):
         self.fs_merge = FileSelector(file_type=QFileDialog.FileMode.AnyFile)
         layout_save.addWidget(label_save)
         layout_save.addWidget(self.fs_merge)
+
+        # The first option is the default PLY output, the others save the compact format
+        widget_format = QWidget()
+        layout_format = QFormLayout(widget_format)
+        self.combo_box_format = QComboBox()
+        self.combo_box_format.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
+        self.combo_box_format.addItem("PLY")
+        for enum_member in SHQuantizationType:
+            self.combo_box_format.addItem(f"Compact ({enum_member.instance_name} SH)")
+        layout_format.addRow("Save format:", self.combo_box_format)
         bt_merge = CustomPushButton("Merge point clouds", 90)
         bt_merge.connect_to_clicked(self.merge_point_clouds)
 
         layout.addWidget(label_title)
         layout.addWidget(self.group_box_widget)
         layout.addWidget(widget_save)
+        layout.addWidget(widget_format)
         layout.addWidget(bt_merge)
         layout.addStretch()
 
@@ -75,5 +87,7 @@ class MergeTab(QWidget):
         pc_path2 = self.fs_input2.file_path
         merge_path = self.fs_merge.file_path
         transformation = self.ui_repository.transformation_matrix
+        format_index = self.combo_box_format.currentIndex()
+        sh_quantization = SHQuantizationType(format_index - 1) if format_index > 0 else None
         self.signal_merge_point_clouds.emit(SaveRequestParams(merge_path, transformation, is_checked,
-                                                              pc_path1, pc_path2))
+                                                              pc_path1, pc_path2, sh_quantization))
@@ -145,6 +145,7 @@ class RegistrationMainWindow(QMainWindow):
 
         self.hem_widget = GaussianMixtureTab()
         self.hem_widget.signal_create_mixture.connect(self.downsampler_controller.create_mixture)
+        self.hem_widget.signal_create_lod.connect(self.downsampler_controller.create_lod_levels)
         self.hem_widget.signal_slider_changed.connect(self.active_pc_changed)
         self.downsampler_controller.signal_update_hem_slider.connect(self.hem_widget.update_hem_slider)
 
@@ -174,6 +175,11 @@ class RegistrationMainWindow(QMainWindow):
         self.io_controller.signal_ui_update.connect(self.update_ui_after_pc_loaded)
         self.io_controller.load_point_clouds_signal.connect(self.visualizer_window.load_point_clouds)
 
+        # Downsampler Controller
+        self.downsampler_controller.signal_single_error.connect(self.handle_error)
+        self.downsampler_controller.signal_list_error.connect(self.handle_error)
+        self.downsampler_controller.signal_success_message.connect(self.create_success_dialog)
+
         # Plane Fitting Controller
         self.plane_fitting_controller.signal_single_error.connect(self.handle_error)
         self.plane_fitting_controller.signal_list_error.connect(self.handle_error)
@@ -284,6 +290,7 @@ class RegistrationMainWindow(QMainWindow):
 
     def closeEvent(self, event):
         self.visualizer_window.vis_open3d.close()
+        self.data_repository.memory_budget.close()
         super(QMainWindow, self).closeEvent(event)
 
     def handle_error(self, error):
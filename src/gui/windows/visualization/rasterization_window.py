@@ -8,7 +8,7 @@ from PySide6.QtWidgets import QVBoxLayout, QGraphicsView, QGraphicsScene, QGraph
 from gui.windows.visualization.fx.temporal_anit_aliasing import TemporalAntiAliasing
 from gui.windows.visualization.viewer_interface import ViewerInterface
 from params.io_parameters import PointCloudState
-from src.models.gaussian_model import GaussianModel
+from src.models.gaussian_model import MergedGaussianModel
 from src.utils.rasterization_util import rasterize_image, get_pixmap_from_tensor
 
 
@@ -225,12 +225,12 @@ class GaussianSplatWindow(ViewerInterface):
         if self.pc1 is None or self.pc2 is None:
             return
 
+        # The merged view only rewrites the first point cloud, if the transformation has actually changed
         if self.point_cloud_merged is not None:
-            self.point_cloud_merged.move_to_device("cpu")
-            del self.point_cloud_merged
-            torch.cuda.empty_cache()
+            self.point_cloud_merged.set_transformation(transformation)
+            return
 
-        self.point_cloud_merged = GaussianModel.get_merged_gaussian_point_clouds(self.pc1, self.pc2, transformation)
+        self.point_cloud_merged = self.create_merged_point_cloud(transformation)
 
     def load_point_clouds(self, params: PointCloudState):
         if self.point_cloud_merged is not None:
@@ -247,8 +247,13 @@ class GaussianSplatWindow(ViewerInterface):
         self.pc1 = params.gauss_pc1
         self.pc2 = params.gauss_pc2
 
-        self.point_cloud_merged = GaussianModel.get_merged_gaussian_point_clouds(self.pc1, self.pc2,
-                                                                                 params.transformation_matrix)
+        self.point_cloud_merged = self.create_merged_point_cloud(params.transformation_matrix)
+
+    def create_merged_point_cloud(self, transformation):
+        merged = MergedGaussianModel(self.pc1, self.pc2, transformation)
+        # The activations and covariances are rendered every frame, so they are only computed once per edit
+        merged.set_derived_caching(True)
+        return merged
 
     def get_current_view(self):
         if self.camera is None:
@@ -1,20 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import mixture_bind
 from PySide6 import QtWidgets
+from PySide6.QtCore import Signal
 
 from src.gui.workers.qt_base_worker import BaseWorker
 from src.models.gaussian_mixture_level import GaussianMixtureModel
 from src.models.gaussian_model import GaussianModel
-from src.utils.point_cloud_converter import convert_gs_to_open3d_pc
+
+# Every conversion runs on cuda:0, so more threads would only contend for the device. Two threads overlap the conversion
+# of the Python lists on the CPU of one level with the work on the device of another one.
+MIXTURE_CONVERSION_WORKER_COUNT = 2
+
+
+def create_mixture_level(pc):
+    return mixture_bind.MixtureLevel.CreateMixtureLevel(
+        pc.get_xyz.detach().cpu().tolist(),
+        pc.get_colors.detach().cpu().tolist(),
+        pc.get_raw_opacity.detach().view(-1).cpu().tolist(),
+        pc.get_covariance(1).detach().cpu().tolist(),
+        pc.get_spherical_harmonics.detach().cpu().tolist())
+
+
+def convert_mixture_level(mixture, sh_degree):
+    """Converts a level of the HEM output to a Gaussian model on the CPU."""
+    mixture_model = GaussianMixtureModel(*mixture_bind.MixtureLevel.CreatePythonLists(mixture))
+    gaussian = GaussianModel(device_name="cuda:0")
+    gaussian.from_mixture(mixture_model, sh_degree)
+    gaussian.move_to_device("cpu")
+
+    return gaussian
 
 
 class GaussianMixtureWorker(BaseWorker):
+    """
+    Creates the Gaussian mixtures of both point clouds. The levels are converted to Gaussian models on a thread pool,
+    the levels of the first point cloud while the mixture of the second one is created. Every level is emitted through
+    signal_level_result as soon as it is converted for both point clouds, so the coarse levels are available before the
+    fine ones. The result only holds the number of emitted levels, which are kept even if the worker is cancelled or
+    fails. It is emitted in any case, after the errors.
+    """
+    signal_level_result = Signal(object)
+
+    class LevelResultData:
+        def __init__(self, level, gaussian_first, gaussian_second):
+            self.level = level
+            self.gaussian_first = gaussian_first
+            self.gaussian_second = gaussian_second
+
     class ResultData:
-        def __init__(self, list_gaussian_first, list_gaussian_second,
-                     list_open3d_first, list_open3d_second):
-            self.list_gaussian_first = list_gaussian_first
-            self.list_gaussian_second = list_gaussian_second
-            self.list_open3d_first = list_open3d_first
-            self.list_open3d_second = list_open3d_second
+        def __init__(self, level_count):
+            self.level_count = level_count
 
     def __init__(self, pc1, pc2, hem_reduction, distance_delta, color_delta, decay_rate, cluster_level):
         super().__init__()
@@ -29,96 +65,85 @@ class GaussianMixtureWorker(BaseWorker):
         self.gaussian_pc_second = pc2
 
         self.current_progress = 0
-        self.max_progress = 6
+        # Two steps per point cloud for the HEM and one for the conversion of every level
+        self.max_progress = 2 * (2 + cluster_level)
         self.signal_cancel = False
 
     def run(self):
-        QtWidgets.QApplication.processEvents()
-        if self.signal_cancel:
-            self.signal_finished.emit()
-            return
-
-        print("Creating Gaussian Mixture Model for the first point cloud.")
-        mixture_level_first = mixture_bind.MixtureLevel.CreateMixtureLevel(
-            self.gaussian_pc_first.get_xyz.detach().cpu().tolist(),
-            self.gaussian_pc_first.get_colors.detach().cpu().tolist(),
-            self.gaussian_pc_first.get_raw_opacity.detach().view(-1).cpu().tolist(),
-            self.gaussian_pc_first.get_covariance(1).detach().cpu().tolist(),
-            self.gaussian_pc_first.get_spherical_harmonics.detach().cpu().tolist())
-
-        self.update_progress()
-        QtWidgets.QApplication.processEvents()
-        if self.signal_cancel:
-            self.signal_finished.emit()
-            return
-
-        mixture_models_first = mixture_bind.MixtureCreator.CreateMixture(self.cluster_level, self.hem_reduction,
-                                                                         self.distance_delta, self.color_delta,
-                                                                         self.decay_rate,
-                                                                         mixture_level_first)
-        self.update_progress()
-        QtWidgets.QApplication.processEvents()
-        if self.signal_cancel:
-            self.signal_finished.emit()
-            return
-
-        print("Creating Gaussian Mixture Model for the second point cloud.")
-        mixture_level_second = mixture_bind.MixtureLevel.CreateMixtureLevel(
-            self.gaussian_pc_second.get_xyz.detach().cpu().tolist(),
-            self.gaussian_pc_second.get_colors.detach().cpu().tolist(),
-            self.gaussian_pc_second.get_raw_opacity.detach().view(-1).cpu().tolist(),
-            self.gaussian_pc_second.get_covariance(1).detach().cpu().tolist(),
-            self.gaussian_pc_second.get_spherical_harmonics.detach().cpu().tolist())
-
-        self.update_progress()
-        QtWidgets.QApplication.processEvents()
-        if self.signal_cancel:
-            self.signal_finished.emit()
-            return
-
-        mixture_models_second = mixture_bind.MixtureCreator.CreateMixture(self.cluster_level, self.hem_reduction,
-                                                                          self.distance_delta, self.color_delta,
-                                                                          self.decay_rate,
-                                                                          mixture_level_second)
-        self.update_progress()
-        QtWidgets.QApplication.processEvents()
-        if self.signal_cancel:
-            self.signal_finished.emit()
-            return
-
-        list_gaussian_first = []
-        list_gaussian_second = []
-        list_open3d_first = []
-        list_open3d_second = []
+        executor = ThreadPoolExecutor(max_workers=MIXTURE_CONVERSION_WORKER_COUNT)
+        level_count = 0
+        try:
+            futures = self.create_mixtures(executor)
+            if futures is not None:
+                level_count = self.emit_levels(futures)
+        except Exception as error:
+            self.signal_error.emit([f"Creating the Gaussian mixtures failed: {error}"])
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        self.signal_result.emit(GaussianMixtureWorker.ResultData(level_count))
+        self.signal_finished.emit()
 
+    def create_mixtures(self, executor):
+        """Creates the mixtures and submits the conversion of their levels, returns None if it was cancelled."""
+        futures = {}
         sh_degree = self.gaussian_pc_first.sh_degree
-        for mixture in mixture_models_first:
-            mixture_model = GaussianMixtureModel(*mixture_bind.MixtureLevel.CreatePythonLists(mixture))
-            gaussian = GaussianModel(device_name="cuda:0")
-            gaussian.from_mixture(mixture_model, sh_degree)
-            gaussian.move_to_device("cpu")
-
-            result_open3d = convert_gs_to_open3d_pc(gaussian)
-            list_gaussian_first.append(gaussian)
-            list_open3d_first.append(result_open3d)
-
-        self.update_progress()
-
-        for mixture in mixture_models_second:
-            mixture_model = GaussianMixtureModel(*mixture_bind.MixtureLevel.CreatePythonLists(mixture))
-            gaussian = GaussianModel(device_name="cuda:0")
-            gaussian.from_mixture(mixture_model, sh_degree)
-            gaussian.move_to_device("cpu")
-
-            result_open3d = convert_gs_to_open3d_pc(gaussian)
-            list_gaussian_second.append(gaussian)
-            list_open3d_second.append(result_open3d)
-
-        self.update_progress()
-
-        self.signal_result.emit(GaussianMixtureWorker.ResultData(list_gaussian_first, list_gaussian_second,
-                                list_open3d_first, list_open3d_second))
-        self.signal_finished.emit()
+        for pc_index, (pc, name) in enumerate(((self.gaussian_pc_first, "first"), (self.gaussian_pc_second, "second"))):
+            QtWidgets.QApplication.processEvents()
+            if self.signal_cancel:
+                return None
+
+            print(f"Creating Gaussian Mixture Model for the {name} point cloud.")
+            mixture_level = create_mixture_level(pc)
+
+            self.update_progress()
+            QtWidgets.QApplication.processEvents()
+            if self.signal_cancel:
+                return None
+
+            mixture_models = mixture_bind.MixtureCreator.CreateMixture(self.cluster_level, self.hem_reduction,
+                                                                       self.distance_delta, self.color_delta,
+                                                                       self.decay_rate, mixture_level)
+            self.max_progress += len(mixture_models) - self.cluster_level
+            self.update_progress()
+
+            # Every HEM level is a reduction of the previous one, so the coarsest levels are converted first
+            for level in reversed(range(len(mixture_models))):
+                future = executor.submit(convert_mixture_level, mixture_models[level], sh_degree)
+                futures[future] = (level, pc_index)
+
+        return futures
+
+    def emit_levels(self, futures):
+        """
+        Emits every level once both of its point clouds are converted, returns the number of emitted levels. A failed
+        conversion is reported and stops the remaining ones.
+        """
+        converted_levels = {}
+        level_count = 0
+        for future in as_completed(futures):
+            level, pc_index = futures[future]
+            try:
+                gaussian = future.result()
+            except Exception as error:
+                self.signal_error.emit([f"Converting level {level + 1} of the {('first', 'second')[pc_index]} "
+                                        f"Gaussian mixture failed: {error}"])
+                break
+
+            converted_levels.setdefault(level, [None, None])[pc_index] = gaussian
+            self.update_progress()
+
+            if None not in converted_levels[level]:
+                gaussian_first, gaussian_second = converted_levels.pop(level)
+                self.signal_level_result.emit(GaussianMixtureWorker.LevelResultData(level, gaussian_first,
+                                                                                    gaussian_second))
+                level_count += 1
+
+            QtWidgets.QApplication.processEvents()
+            if self.signal_cancel:
+                break
+
+        return level_count
 
     def update_progress(self):
         self.current_progress += 1
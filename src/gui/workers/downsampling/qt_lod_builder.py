@@ -0,0 +1,50 @@
+from PySide6 import QtWidgets
+
+from params.merge_parameters import LodParams
+from src.gui.workers.qt_base_worker import BaseWorker
+
+
+class LodBuilderWorker(BaseWorker):
+    """
+    Creates the importance-based levels of detail of both point clouds. The levels are subsets of the splats, so
+    unlike the Gaussian mixtures they take only a fraction of a second even for large scenes.
+    """
+
+    class ResultData:
+        def __init__(self, list_gaussian_first, list_gaussian_second):
+            self.list_gaussian_first = list_gaussian_first
+            self.list_gaussian_second = list_gaussian_second
+
+    def __init__(self, pc1, pc2, params: LodParams):
+        super().__init__()
+
+        self.fractions = params.get_fractions()
+
+        self.gaussian_pc_first = pc1
+        self.gaussian_pc_second = pc2
+
+        self.current_progress = 0
+        self.max_progress = 2
+        self.signal_cancel = False
+
+    def run(self):
+        results = []
+        for pc in (self.gaussian_pc_first, self.gaussian_pc_second):
+            QtWidgets.QApplication.processEvents()
+            if self.signal_cancel:
+                self.signal_finished.emit()
+                return
+
+            results.append(pc.build_lod_levels(self.fractions))
+            self.update_progress()
+
+        self.signal_result.emit(LodBuilderWorker.ResultData(*results))
+        self.signal_finished.emit()
+
+    def update_progress(self):
+        self.current_progress += 1
+        new_percent = int(self.current_progress / self.max_progress * 100)
+        self.signal_progress.emit(new_percent)
+
+    def cancel(self):
+        self.signal_cancel = True
@@ -6,7 +6,6 @@ from params.merge_parameters import GaussianMixtureParams
 from src.gui.workers.qt_base_worker import BaseWorker
 from src.models.gaussian_mixture_level import GaussianMixtureModel
 from src.models.gaussian_model import GaussianModel
-from src.utils.point_cloud_converter import convert_gs_to_open3d_pc
 
 
 def initialize_mixture_storage(cluster_level):
@@ -19,7 +18,6 @@ def initialize_mixture_storage(cluster_level):
 
 def create_models_from_mixture(xyz_list, colors_list, opacities_list, covariance_list, features_list):
     gaussian_models = []
-    open3d_point_clouds = []
 
     for depth in range(len(xyz_list)):
         if not xyz_list[depth]:
@@ -32,13 +30,9 @@ def create_models_from_mixture(xyz_list, colors_list, opacities_list, covariance
         gaussian = GaussianModel(device_name="cuda:0")
         gaussian.from_mixture(mixture_model)
         gaussian.move_to_device("cpu")
-
-        result_open3d = convert_gs_to_open3d_pc(gaussian)
-
         gaussian_models.append(gaussian)
-        open3d_point_clouds.append(result_open3d)
 
-    return gaussian_models, open3d_point_clouds
+    return gaussian_models
 
 
 def process_plane(pc, plane_indices):
@@ -57,12 +51,9 @@ def process_plane(pc, plane_indices):
 
 class PlaneInlierMergingWorker(BaseWorker):
     class ResultData:
-        def __init__(self, list_gaussian_first, list_gaussian_second,
-                     list_open3d_first, list_open3d_second):
+        def __init__(self, list_gaussian_first, list_gaussian_second):
             self.list_gaussian_first = list_gaussian_first
             self.list_gaussian_second = list_gaussian_second
-            self.list_open3d_first = list_open3d_first
-            self.list_open3d_second = list_open3d_second
 
     def __init__(self, pc1, pc2, first_plane_indices, second_plane_indices, params: GaussianMixtureParams):
         super().__init__()
@@ -109,16 +100,12 @@ class PlaneInlierMergingWorker(BaseWorker):
                                               self.second_plane_indices))
 
         print("Creating final Gaussian models.")
-        list_gaussian_first, list_open3d_first = create_models_from_mixture(xyz_first, colors_first, opacities_first,
-                                                                            covariance_first, features_first)
-        list_gaussian_second, list_open3d_second = create_models_from_mixture(xyz_second, colors_second,
-                                                                              opacities_second, covariance_second,
-                                                                              features_second)
+        list_gaussian_first = create_models_from_mixture(xyz_first, colors_first, opacities_first,
+                                                         covariance_first, features_first)
+        list_gaussian_second = create_models_from_mixture(xyz_second, colors_second, opacities_second,
+                                                          covariance_second, features_second)
         self.signal_progress.emit(100)
-        self.signal_result.emit(PlaneInlierMergingWorker.ResultData(
-            list_gaussian_first, list_gaussian_second,
-            list_open3d_first, list_open3d_second
-        ))
+        self.signal_result.emit(PlaneInlierMergingWorker.ResultData(list_gaussian_first, list_gaussian_second))
         self.signal_finished.emit()
 
     def update_progress(self):
@@ -1,29 +1,43 @@
+import os
+import tempfile
+
 import torch
 
 from src.gui.workers.qt_base_worker import BaseWorker
-from src.models.gaussian_model import GaussianModel
-from src.utils.file_loader import load_plyfile_pc, is_point_cloud_gaussian
+from src.models.compact_gaussian_model import CompactGaussianModel
+from src.models.gaussian_model import GaussianModel, MergedGaussianModel
+from src.utils.file_loader import load_gaussian_model, probe_point_cloud, PointCloudType
 
 
 class GaussianSaverBase(BaseWorker):
-    def __init__(self, transformation, path):
+    def __init__(self, transformation, path, sh_quantization=None):
         super().__init__()
         self.transformation = transformation
         self.path = path
+        # If set, the merged point cloud is saved in the compact format instead of PLY
+        self.sh_quantization = sh_quantization
+
+    def emit_error(self, message):
+        self.signal_error.emit([message])
+        self.signal_progress.emit(100)
+        self.signal_finished.emit()
 
     def merge_and_save(self, pc_first, pc_second):
         if pc_first.sh_degree != pc_second.sh_degree:
-            self.signal_error.emit(
-                ["The selected point clouds have different sh degrees."])
-            self.signal_progress.emit(100)
-            self.signal_finished.emit()
+            self.emit_error("The selected point clouds have different sh degrees.")
             return
 
-        merged = GaussianModel.get_merged_gaussian_point_clouds(pc_first, pc_second,
-                                                                self.transformation)
         torch.cuda.empty_cache()
-        merged.save_ply(self.path)
-        del merged
+        if self.sh_quantization is None:
+            # The PLY file is written block by block, the merged point cloud is never built
+            GaussianModel.save_merged_ply(pc_first, pc_second, self.transformation, self.path)
+        else:
+            # The compact format needs the whole merged point cloud, which is kept in a memory-mapped file on the CPU
+            with tempfile.TemporaryDirectory() as directory:
+                buffer_path = os.path.join(directory, "merged.npy") if pc_first.device_name == "cpu" else None
+                merged = MergedGaussianModel(pc_first, pc_second, self.transformation, buffer_path, file_order=True)
+                CompactGaussianModel.from_gaussian(merged, self.sh_quantization).save(self.path)
+                del merged
         torch.cuda.empty_cache()
         self.signal_progress.emit(100)
         self.signal_finished.emit()
@@ -31,8 +45,8 @@ class GaussianSaverBase(BaseWorker):
 
 class GaussianSaverNormal(GaussianSaverBase):
 
-    def __init__(self, pc_first, pc_second, transformation, path):
-        super().__init__(transformation, path)
+    def __init__(self, pc_first, pc_second, transformation, path, sh_quantization=None):
+        super().__init__(transformation, path, sh_quantization)
         self.pc_first = pc_first
         self.pc_second = pc_second
 
@@ -41,26 +55,29 @@ class GaussianSaverNormal(GaussianSaverBase):
 
 
 class GaussianSaverUseCorresponding(GaussianSaverBase):
-    def __init__(self, pc_path_first, pc_path_second, transformation, path):
-        super().__init__(transformation, path)
+    def __init__(self, pc_path_first, pc_path_second, transformation, path, sh_quantization=None):
+        super().__init__(transformation, path, sh_quantization)
         self.pc_path_first = pc_path_first
         self.pc_path_second = pc_path_second
 
     def run(self):
-        pc_first_ply = load_plyfile_pc(self.pc_path_first)
-        pc_second_ply = load_plyfile_pc(self.pc_path_second)
-        if (not pc_first_ply or not pc_second_ply or
-                not is_point_cloud_gaussian(pc_first_ply) or not is_point_cloud_gaussian(pc_second_ply)):
-            self.signal_error.emit(
-                ["Importing one or both of the point clouds failed.\nPlease check that you entered the "
-                 "correct path and the point clouds selected are Gaussian point clouds!"])
-            self.signal_progress.emit(100)
-            self.signal_finished.emit()
+        # The headers are checked before either of the files is read
+        probes = [probe_point_cloud(self.pc_path_first), probe_point_cloud(self.pc_path_second)]
+        if any(probe is None or probe.point_cloud_type is not PointCloudType.GAUSSIAN for probe in probes):
+            self.emit_error("Importing one or both of the point clouds failed.\nPlease check that you entered the "
+                            "correct path and the point clouds selected are Gaussian point clouds!")
             return
 
-        pc_first = GaussianModel()
-        pc_second = GaussianModel()
-        pc_first.from_ply(pc_first_ply)
-        pc_second.from_ply(pc_second_ply)
+        if probes[0].sh_degree != probes[1].sh_degree:
+            self.emit_error("The selected point clouds have different sh degrees.")
+            return
+
+        # The attributes stay in the memory-mapped files and they are only read block by block while saving
+        pc_first = load_gaussian_model(self.pc_path_first, lazy=True, device_name="cpu")
+        pc_second = load_gaussian_model(self.pc_path_second, lazy=True, device_name="cpu")
+        if pc_first is None or pc_second is None:
+            self.emit_error("Importing one or both of the point clouds failed.\nPlease check that you entered the "
+                            "correct path and the point clouds selected are Gaussian point clouds!")
+            return
 
         self.merge_and_save(pc_first, pc_second)
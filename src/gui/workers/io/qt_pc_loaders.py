@@ -1,6 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+
 from src.gui.workers.qt_base_worker import BaseWorker
 from src.utils.file_loader import load_sparse_pc, load_o3d_pc, save_point_clouds_to_cache, \
-    load_gaussian_pc
+    load_gaussian_pc, load_registration_pc, STREAMING_SIZE_THRESHOLD
+from src.utils.point_cloud_converter import NormalEstimationType, NormalOrientationType
+
+
+def load_concurrently(worker: BaseWorker, load_function, *paths, report_bytes=False):
+    """
+    Loads every path with the given function on a thread pool and returns the results in the order of the paths.
+    Parsing, tensor construction and normal estimation mostly release the GIL, so the files load in parallel.
+    The progress of the worker is updated whenever one of the files is finished. If report_bytes is set, the load
+    function also gets a progress callback, which reports the bytes read of its file while it is streamed.
+    """
+    fractions = [0.0] * len(paths)
+
+    def report_progress(index, bytes_read, total_size):
+        fractions[index] = bytes_read / total_size if total_size else 1.0
+        worker.signal_progress.emit(int(sum(fractions) / len(fractions) * 100))
+
+    with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+        if report_bytes:
+            futures = [executor.submit(load_function, path, progress_callback=partial(report_progress, index))
+                       for index, path in enumerate(paths)]
+        else:
+            futures = [executor.submit(load_function, path) for path in paths]
+
+        for finished_count, _ in enumerate(as_completed(futures), start=1):
+            worker.signal_progress.emit(int(finished_count / len(futures) * 100))
+
+        return [future.result() for future in futures]
 
 
 class PointCloudLoaderInput(BaseWorker):
@@ -9,16 +39,21 @@ class PointCloudLoaderInput(BaseWorker):
             self.point_cloud_first = point_cloud_first
             self.point_cloud_second = point_cloud_second
 
-    def __init__(self, point_cloud_path_first, point_cloud_path_second):
+    def __init__(self, point_cloud_path_first, point_cloud_path_second, stream_large_files=True, stride=1,
+                 voxel_size=0.0):
         super().__init__()
         self.point_cloud_path_first = point_cloud_path_first
         self.point_cloud_path_second = point_cloud_path_second
+        self.stream_large_files = stream_large_files
+        self.stride = stride
+        self.voxel_size = voxel_size
 
     def run(self):
-        result_first = load_sparse_pc(self.point_cloud_path_first)
-        self.signal_progress.emit(50)
-        result_second = load_sparse_pc(self.point_cloud_path_second)
-        self.signal_progress.emit(100)
+        load_function = partial(load_sparse_pc,
+                                streaming_threshold=STREAMING_SIZE_THRESHOLD if self.stream_large_files else None,
+                                stride=self.stride, voxel_size=self.voxel_size)
+        result_first, result_second = load_concurrently(self, load_function, self.point_cloud_path_first,
+                                                        self.point_cloud_path_second, report_bytes=True)
         self.signal_result.emit(PointCloudLoaderInput.ResultData(result_first, result_second))
         self.signal_finished.emit()
 
@@ -32,16 +67,34 @@ class PointCloudLoaderGaussian(BaseWorker):
             self.gaussian_point_cloud_first = gaussian_point_cloud_first
             self.gaussian_point_cloud_second = gaussian_point_cloud_second
 
-    def __init__(self, point_cloud_path_first, point_cloud_path_second):
+    def __init__(self, point_cloud_path_first, point_cloud_path_second, lazy_load=False, spatial_sort=False,
+                 normal_estimation=NormalEstimationType.Covariance, registration_only=False, stride=1,
+                 voxel_size=0.0, min_opacity=0.0, normal_orientation=NormalOrientationType.Disabled):
         super().__init__()
         self.point_cloud_path_first = point_cloud_path_first
         self.point_cloud_path_second = point_cloud_path_second
+        self.lazy_load = lazy_load
+        self.spatial_sort = spatial_sort
+        self.normal_estimation = normal_estimation
+        self.registration_only = registration_only
+        self.stride = stride
+        self.voxel_size = voxel_size
+        self.min_opacity = min_opacity
+        self.normal_orientation = normal_orientation
 
     def run(self):
-        o3d_pc1, gs_pc1 = load_gaussian_pc(self.point_cloud_path_first)
-        self.signal_progress.emit(50)
-        o3d_pc2, gs_pc2 = load_gaussian_pc(self.point_cloud_path_second)
-        self.signal_progress.emit(100)
+        if self.registration_only:
+            load_function = partial(load_registration_pc, stride=self.stride, voxel_size=self.voxel_size,
+                                    min_opacity=self.min_opacity, normal_estimation=self.normal_estimation,
+                                    normal_orientation=self.normal_orientation)
+        else:
+            load_function = partial(load_gaussian_pc, lazy=self.lazy_load, spatial_sort=self.spatial_sort,
+                                    normal_estimation=self.normal_estimation,
+                                    normal_orientation=self.normal_orientation)
+
+        (o3d_pc1, gs_pc1), (o3d_pc2, gs_pc2) = load_concurrently(self, load_function, self.point_cloud_path_first,
+                                                                 self.point_cloud_path_second,
+                                                                 report_bytes=self.registration_only)
         self.signal_result.emit(PointCloudLoaderGaussian.ResultData(o3d_pc1, o3d_pc2, gs_pc1, gs_pc2))
         self.signal_finished.emit()
 
@@ -58,10 +111,7 @@ class PointCloudLoaderO3D(BaseWorker):
         self.point_cloud2 = point_cloud2
 
     def run(self):
-        result1 = load_o3d_pc(self.point_cloud1)
-        self.signal_progress.emit(50)
-        result2 = load_o3d_pc(self.point_cloud2)
-        self.signal_progress.emit(100)
+        result1, result2 = load_concurrently(self, load_o3d_pc, self.point_cloud1, self.point_cloud2)
         self.signal_result.emit(PointCloudLoaderO3D.ResultData(result1, result2))
         self.signal_finished.emit()
 
@@ -4,7 +4,7 @@ from PySide6.QtCore import Signal
 
 from src.gui.workers.qt_base_worker import BaseWorker
 from src.models.registration_data import LocalRegistrationData
-from src.utils.local_registration_util import do_icp_registration
+from src.utils.local_registration_util import do_icp_registration, do_tensor_icp_registration, uses_tensor_backend
 
 
 class LocalRegistrator(BaseWorker):
@@ -18,19 +18,34 @@ class LocalRegistrator(BaseWorker):
     def __init__(self, pc1, pc2, init_trans, params):
         super().__init__()
 
-        self.pc1 = copy.deepcopy(pc1)
-        self.pc2 = copy.deepcopy(pc2)
         self.init_trans = init_trans
         self.registration_params = params
+        if uses_tensor_backend(params):
+            # The tensor point clouds share the storage of the models, but the registration does not modify them
+            self.pc1 = pc1
+            self.pc2 = pc2
+        else:
+            self.pc1 = copy.deepcopy(pc1)
+            self.pc2 = copy.deepcopy(pc2)
 
     def run(self):
-        results = do_icp_registration(self.pc1, self.pc2, self.init_trans, self.registration_params)
+        if uses_tensor_backend(self.registration_params):
+            results = do_tensor_icp_registration(self.pc1, self.pc2, self.init_trans, self.registration_params,
+                                                 self.iteration_finished)
+        else:
+            results = do_icp_registration(self.pc1, self.pc2, self.init_trans, self.registration_params)
 
         dataclass = self.create_dataclass_object(results)
         self.signal_result.emit(LocalRegistrator.ResultData(results, dataclass))
         self.signal_progress.emit(100)
         self.signal_finished.emit()
 
+    def iteration_finished(self, attributes):
+        # Every scale may run up to the max iteration count, the progress is relative to the sum of them
+        iteration_count = max(self.registration_params.scale_count, 1) * self.registration_params.max_iteration
+        iteration_index = int(attributes["iteration_index"].item())
+        self.signal_progress.emit(min(99, (iteration_index + 1) * 100 // max(iteration_count, 1)))
+
     def create_dataclass_object(self, results):
         return LocalRegistrationData(registration_type=self.registration_params.registration_type.instance_name,
                                      initial_transformation=self.init_trans,
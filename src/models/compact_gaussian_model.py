@@ -0,0 +1,190 @@
+import math
+from enum import Enum
+
+import numpy as np
+import torch
+
+from src.models.gaussian_model import GaussianModel
+from src.utils.general_utils import inverse_sigmoid
+
+# Magic number of the numpy archive (zip) based compact files
+COMPACT_FILE_MAGIC = b"PK\x03\x04"
+
+# Quaternion components other than the largest one, in storage order
+QUATERNION_OTHER_COMPONENTS = torch.tensor([[1, 2, 3], [0, 2, 3], [0, 1, 3], [0, 1, 2]])
+QUATERNION_SCALE = 32767 * math.sqrt(2)
+
+# Number of splats trained on and assigned at once when building the SH codebook
+CODEBOOK_TRAINING_SIZE = 1 << 17
+CODEBOOK_ASSIGNMENT_CHUNK_SIZE = 1 << 14
+
+
+class SHQuantizationType(Enum):
+    def __new__(cls, *args, **kwds):
+        value = len(cls.__members__)
+        obj = object.__new__(cls)
+        obj._value_ = value
+        return obj
+
+    def __init__(self, name):
+        self.instance_name = name
+
+    Float16 = "Float16"
+    Codebook = "Codebook"
+
+
+def is_compact_file(path):
+    with open(path, "rb") as file:
+        return file.read(len(COMPACT_FILE_MAGIC)) == COMPACT_FILE_MAGIC
+
+
+def pack_quaternions(rotations):
+    """
+    Packs the normalized quaternions with the "smallest three" method: the index of the largest component (uint8)
+    and the other three components, which are in [-1/sqrt(2), 1/sqrt(2)], as int16.
+    """
+    quaternions = torch.nn.functional.normalize(rotations.float(), dim=-1)
+    largest_index = torch.argmax(torch.abs(quaternions), dim=-1)
+    # q and -q are the same rotation, so the largest component can always be positive
+    signs = torch.sign(torch.gather(quaternions, 1, largest_index.unsqueeze(1)))
+    quaternions = quaternions * torch.where(signs == 0, 1.0, signs)
+
+    others = torch.gather(quaternions, 1, QUATERNION_OTHER_COMPONENTS.to(quaternions.device)[largest_index])
+    packed = torch.round(others * QUATERNION_SCALE).clamp(-32767, 32767).to(torch.int16)
+    return largest_index.to(torch.uint8), packed
+
+
+def unpack_quaternions(largest_index, packed):
+    largest_index = largest_index.long()
+    others = packed.float() / QUATERNION_SCALE
+    largest = torch.sqrt(torch.clamp(1.0 - torch.sum(others * others, dim=-1, keepdim=True), min=0.0))
+
+    quaternions = torch.empty((packed.shape[0], 4), dtype=torch.float, device=packed.device)
+    quaternions.scatter_(1, largest_index.unsqueeze(1), largest)
+    quaternions.scatter_(1, QUATERNION_OTHER_COMPONENTS.to(packed.device)[largest_index], others)
+    return quaternions
+
+
+def quantize_opacities(raw_opacities):
+    return torch.round(torch.sigmoid(raw_opacities.float()) * 255).to(torch.uint8)
+
+
+def dequantize_opacities(quantized):
+    # Half a quantization step away from 0 and 1, so the inverse sigmoid stays finite
+    epsilon = 0.5 / 255
+    return inverse_sigmoid(torch.clamp(quantized.float() / 255, epsilon, 1 - epsilon))
+
+
+def build_codebook(vectors, codebook_size, iterations):
+    """Runs k-means on a random subset of the vectors and assigns every vector to its closest centroid."""
+    generator = torch.Generator(device="cpu").manual_seed(0)
+    sample_count = min(vectors.shape[0], CODEBOOK_TRAINING_SIZE)
+    samples = vectors[torch.randperm(vectors.shape[0], generator=generator)[:sample_count].to(vectors.device)]
+    codebook_size = min(codebook_size, sample_count)
+    codebook = samples[torch.randperm(sample_count, generator=generator)[:codebook_size].to(vectors.device)].clone()
+
+    for _ in range(iterations):
+        assignment = torch.cdist(samples, codebook).argmin(dim=1)
+        sums = torch.zeros_like(codebook).index_add_(0, assignment, samples)
+        counts = torch.bincount(assignment, minlength=codebook_size).unsqueeze(1)
+        # Empty clusters keep their previous centroid
+        codebook = torch.where(counts > 0, sums / counts.clamp(min=1), codebook)
+
+    indices = torch.cat([torch.cdist(vectors[start:start + CODEBOOK_ASSIGNMENT_CHUNK_SIZE], codebook).argmin(dim=1)
+                         for start in range(0, vectors.shape[0], CODEBOOK_ASSIGNMENT_CHUNK_SIZE)])
+    return codebook, indices
+
+
+class CompactGaussianModel:
+    """
+    Quantized representation of a GaussianModel, used to save and load smaller files. The quantization is lossy, so
+    the models held or spilled by the memory budget stay in their exact representation. Positions are kept as
+    float32, the DC colors and scaling as float16, the opacities as 8-bit activated values, the rotations as
+    "smallest three" packed quaternions, and the higher order SH coefficients either as float16 or as uint16 indices
+    into a float16 k-means codebook. The covariances are only stored if they can not be derived from the scaling and
+    rotation (e.g. for the Gaussian mixture levels).
+    """
+
+    def __init__(self):
+        self.sh_degree = -1
+        self.arrays = {}
+
+    @staticmethod
+    def from_gaussian(gaussian: GaussianModel, sh_quantization=SHQuantizationType.Float16, codebook_size=4096,
+                      codebook_iterations=10):
+        compact = CompactGaussianModel()
+        compact.sh_degree = gaussian.sh_degree
+
+        with torch.no_grad():
+            arrays = {
+                "xyz": gaussian._xyz.float(),
+                "features_dc": gaussian._features_dc.flatten(start_dim=1).half(),
+                "opacity": quantize_opacities(gaussian._opacity),
+                "scaling": gaussian._scaling.half(),
+            }
+            arrays["rotation_index"], arrays["rotation"] = pack_quaternions(gaussian._rotation)
+
+            features_rest = gaussian._features_rest.flatten(start_dim=1).float()
+            if sh_quantization is SHQuantizationType.Codebook and features_rest.numel() > 0:
+                codebook_size = min(codebook_size, 1 << 16)
+                codebook, indices = build_codebook(features_rest, codebook_size, codebook_iterations)
+                arrays["sh_codebook"] = codebook.half()
+                arrays["sh_indices"] = indices.to(torch.int32)
+            else:
+                arrays["features_rest"] = features_rest.half()
+
+            derived_covariance = gaussian.covariance_activation(gaussian.get_scaling, 1.0, gaussian._rotation)
+            if not torch.allclose(derived_covariance, gaussian._covariance, rtol=1e-3, atol=1e-7):
+                arrays["covariance"] = gaussian._covariance.float()
+
+        compact.arrays = {name: array.detach().cpu().numpy() for name, array in arrays.items()}
+        if "sh_indices" in compact.arrays:
+            compact.arrays["sh_indices"] = compact.arrays["sh_indices"].astype(np.uint16)
+
+        return compact
+
+    def to_gaussian(self, device_name="cpu"):
+        def tensor(name, dtype=None):
+            array = self.arrays[name]
+            if array.dtype == np.uint16:
+                array = array.astype(np.int32)
+            return torch.from_numpy(array).to(device=device_name, dtype=dtype)
+
+        gaussian = GaussianModel(device_name)
+        gaussian.sh_degree = self.sh_degree
+        gaussian._xyz = tensor("xyz", torch.float)
+        gaussian._features_dc = tensor("features_dc", torch.float).view(-1, 1, 3)
+        if "sh_codebook" in self.arrays:
+            features_rest = tensor("sh_codebook", torch.float)[tensor("sh_indices").long()]
+        else:
+            features_rest = tensor("features_rest", torch.float)
+        # The splat count is explicit, as -1 can not be inferred for the empty features of SH degree 0
+        gaussian._features_rest = features_rest.reshape(gaussian._xyz.shape[0], (self.sh_degree + 1) ** 2 - 1, 3)
+        gaussian._opacity = dequantize_opacities(tensor("opacity"))
+        gaussian._scaling = tensor("scaling", torch.float)
+        gaussian._rotation = unpack_quaternions(tensor("rotation_index"), tensor("rotation"))
+
+        if "covariance" in self.arrays:
+            gaussian._covariance = tensor("covariance", torch.float)
+        else:
+            gaussian._covariance = gaussian.covariance_activation(gaussian.get_scaling, 1.0, gaussian._rotation)
+
+        return gaussian
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def save(self, path):
+        # Writing through a file object keeps numpy from appending the .npz extension
+        with open(path, "wb") as file:
+            np.savez(file, sh_degree=np.array(self.sh_degree), **self.arrays)
+
+    @staticmethod
+    def load(path):
+        compact = CompactGaussianModel()
+        with np.load(path) as archive:
+            compact.sh_degree = int(archive["sh_degree"])
+            compact.arrays = {name: archive[name] for name in archive.files if name != "sh_degree"}
+
+        return compact
@@ -1,19 +1,32 @@
 from PySide6.QtCore import QObject, Signal
 
+from src.models.memory_budget import MemoryBudget, ManagedList, get_default_budget
+from src.models.open3d_cache import Open3DConversionCache, TensorConversionCache, LazyOpen3DList, OPEN3D_CACHE_SIZE
+from src.utils.point_cloud_converter import convert_open3d_pc_to_tensor_pc
+
 
 class DataRepository(QObject):
     signal_planes_changed = Signal(list)
 
-    def __init__(self):
+    def __init__(self, memory_budget=None, open3d_cache_size=OPEN3D_CACHE_SIZE):
         super().__init__()
 
+        # The point cloud lists are kept under the memory budget (in bytes, half of the physical memory by default)
+        self.memory_budget = MemoryBudget(get_default_budget() if memory_budget is None else memory_budget)
+
         # Point cloud output of the 3D Gaussian Splatting
-        self.pc_gaussian_list_first = []
-        self.pc_gaussian_list_second = []
+        self._pc_gaussian_list_first = ManagedList(self.memory_budget, "Gaussian point clouds (first)")
+        self._pc_gaussian_list_second = ManagedList(self.memory_budget, "Gaussian point clouds (second)")
 
-        # Open3D point clouds to display
-        self.pc_open3d_list_first = []
-        self.pc_open3d_list_second = []
+        # Open3D point clouds to display. The None entries are converted from the Gaussian point clouds on access,
+        # the last few conversions are cached.
+        self.open3d_cache = Open3DConversionCache(open3d_cache_size, self.memory_budget)
+        self._pc_open3d_list_first = LazyOpen3DList(ManagedList(self.memory_budget, "Open3D point clouds (first)"),
+                                                    self._pc_gaussian_list_first, self.open3d_cache)
+        self._pc_open3d_list_second = LazyOpen3DList(ManagedList(self.memory_budget, "Open3D point clouds (second)"),
+                                                     self._pc_gaussian_list_second, self.open3d_cache)
+        # Tensor point clouds of the Gaussian point clouds for the plane fitting and the tensor registration
+        self.tensor_cache = TensorConversionCache(open3d_cache_size, self.memory_budget)
 
         # Plane coefficients and indices
         self.first_plane_coefficients = []
@@ -28,6 +41,16 @@ class DataRepository(QObject):
         # Dataclass that stores the results and parameters of the last local registration
         self.local_registration_data = None
 
+    @property
+    def normal_estimation(self):
+        return self.open3d_cache.normal_estimation
+
+    @normal_estimation.setter
+    def normal_estimation(self, normal_estimation):
+        # The levels and tensor point clouds converted on demand estimate their normals like the loaded point clouds
+        self.open3d_cache.normal_estimation = normal_estimation
+        self.tensor_cache.normal_estimation = normal_estimation
+
     @property
     def planes(self):
         return self._planes
@@ -36,3 +59,63 @@ class DataRepository(QObject):
     def planes(self, planes):
         self._planes = planes
         self.signal_planes_changed.emit(planes)
+
+    # The setters replace the contents, so the lists stay managed by the memory budget
+    @property
+    def pc_gaussian_list_first(self):
+        return self._pc_gaussian_list_first
+
+    @pc_gaussian_list_first.setter
+    def pc_gaussian_list_first(self, items):
+        self._pc_gaussian_list_first.replace(items)
+
+    @property
+    def pc_gaussian_list_second(self):
+        return self._pc_gaussian_list_second
+
+    @pc_gaussian_list_second.setter
+    def pc_gaussian_list_second(self, items):
+        self._pc_gaussian_list_second.replace(items)
+
+    @property
+    def pc_open3d_list_first(self):
+        return self._pc_open3d_list_first
+
+    @pc_open3d_list_first.setter
+    def pc_open3d_list_first(self, items):
+        self._pc_open3d_list_first.replace(items)
+
+    @property
+    def pc_open3d_list_second(self):
+        return self._pc_open3d_list_second
+
+    @pc_open3d_list_second.setter
+    def pc_open3d_list_second(self, items):
+        self._pc_open3d_list_second.replace(items)
+
+    def get_tensor_point_clouds(self, index=0, estimate_normals=True):
+        """
+        Returns the point clouds at the index as Open3D tensor point clouds. The ones of a Gaussian model are cached
+        and shared, they must not be modified in place. The sparse inputs are converted from their Open3D point clouds.
+        """
+        return (self._get_tensor_point_cloud(self._pc_gaussian_list_first, self._pc_open3d_list_first, index,
+                                             estimate_normals),
+                self._get_tensor_point_cloud(self._pc_gaussian_list_second, self._pc_open3d_list_second, index,
+                                             estimate_normals))
+
+    def _get_tensor_point_cloud(self, gaussian_list, open3d_list, index, estimate_normals):
+        gaussian = gaussian_list[index] if index < len(gaussian_list) else None
+        if gaussian is not None:
+            return self.tensor_cache.get(gaussian, estimate_normals)
+
+        return convert_open3d_pc_to_tensor_pc(open3d_list[index])
+
+    def get_memory_summary(self):
+        lists = (self._pc_gaussian_list_first, self._pc_gaussian_list_second,
+                 self._pc_open3d_list_first, self._pc_open3d_list_second)
+        resident_size = self.memory_budget.get_resident_size() / 1024 ** 2
+        budget = "unlimited" if self.memory_budget.budget is None else f"{self.memory_budget.budget / 1024 ** 2:.1f} MB"
+        cache_sizes = (self.open3d_cache.get_footprint() / 1024 ** 2, self.tensor_cache.get_footprint() / 1024 ** 2)
+        return "\n".join([managed_list.get_summary() for managed_list in lists] +
+                         [f"Converted point clouds: {cache_sizes[0]:.1f} MB Open3D, {cache_sizes[1]:.1f} MB tensor",
+                          f"Resident: {resident_size:.1f} MB, budget: {budget}"])
@@ -11,18 +11,36 @@
 
 import numpy as np
 import torch
-from plyfile import PlyElement, PlyData
 
 from src.models.gaussian_mixture_level import GaussianMixtureModel
-from src.utils.general_utils import build_scaling_rotation, strip_symmetric, \
-    inverse_sigmoid, matrices_to_quaternions, rebuild_lowerdiag, matrix_to_quaternion
+from src.utils.math_util import rotate_sh
+from src.utils.spatial_sort_util import get_morton_order
+from src.utils.ply_util import get_vertex_block, get_property_indices, get_columns, write_vertex_blocks
+from src.utils.general_utils import strip_symmetric, inverse_sigmoid, matrices_to_quaternions, rebuild_lowerdiag, \
+    build_symmetric_covariance, transform_splats, eigh_3x3
+
+# Number of splats processed at once by the block-wise operations (saving, merging), which bounds the size of the
+# temporaries independently of the size of the models
+BLOCK_SIZE = 1 << 18
+
+# Fractions of the splats kept by the levels of detail of build_lod_levels
+LOD_FRACTIONS = (0.5, 0.25, 0.125)
 
 
 class GaussianModel:
+    # Per-splat attribute tensors. The covariance is derived from the scaling and rotation, so it comes last.
+    attribute_names = ("_xyz", "_features_dc", "_features_rest", "_opacity", "_scaling", "_rotation", "_covariance")
 
     def __init__(self, device_name="cpu"):
         self.sh_degree = -1
         self.device_name = device_name
+        # (N, C) float buffer holding every attribute of a packed model, the attributes are column views of it
+        self._buffer = None
+        # Index of every splat in the loaded file, if the splats have been reordered
+        self.original_indices = None
+        # Derived tensors (activations, expanded covariances), only kept if caching is enabled, see _get_derived
+        self._derived_cache = {}
+        self.cache_derived = False
         self._xyz = torch.empty(0)
         self._features_dc = torch.empty(0)
         self._features_rest = torch.empty(0)
@@ -32,10 +50,7 @@ class GaussianModel:
         self._covariance = torch.empty(0)
 
         def build_covariance_from_scaling_rotation(scaling, scaling_modifier, rotation):
-            L = build_scaling_rotation(scaling_modifier * scaling, rotation)
-            actual_covariance = L @ L.transpose(1, 2)
-            symmetric = strip_symmetric(actual_covariance)
-            return symmetric
+            return build_symmetric_covariance(scaling_modifier * scaling, rotation)
 
         self.scaling_activation = torch.exp
         self.scaling_inverse_activation = torch.log
@@ -44,13 +59,45 @@ class GaussianModel:
         self.inverse_opacity_activation = inverse_sigmoid
         self.rotation_activation = torch.nn.functional.normalize
 
+    def _get_derived(self, key, sources, compute):
+        """
+        Returns the result of compute for the source tensors, cached if cache_derived is set. The result is only
+        reused while every source is the same tensor object and it has not been modified in place (which bumps its
+        version counter, shared with the buffer of a packed model). The cached tensors must not be modified by the
+        callers.
+        """
+        if not self.cache_derived:
+            return compute()
+
+        versions = tuple(source._version for source in sources)
+        entry = self._derived_cache.get(key)
+        if (entry is not None and entry[1] == versions and
+                all(cached is source for cached, source in zip(entry[0], sources))):
+            return entry[2]
+
+        value = compute()
+        self._derived_cache[key] = (sources, versions, value)
+        return value
+
+    def clear_derived_cache(self):
+        self._derived_cache.clear()
+
+    def set_derived_caching(self, enabled):
+        """
+        Enables caching the derived tensors, e.g. for a model that is rendered repeatedly. The cache holds e.g. the
+        full covariances on top of the attributes, so it is disabled by default and cleared when it is disabled.
+        """
+        self.cache_derived = enabled
+        if not enabled:
+            self.clear_derived_cache()
+
     @property
     def get_scaling(self):
-        return self.scaling_activation(self._scaling)
+        return self._get_derived("scaling", (self._scaling,), lambda: self.scaling_activation(self._scaling))
 
     @property
     def get_rotation(self):
-        return self.rotation_activation(self._rotation)
+        return self._get_derived("rotation", (self._rotation,), lambda: self.rotation_activation(self._rotation))
 
     @property
     def get_xyz(self):
@@ -60,7 +107,8 @@ class GaussianModel:
     def get_features(self):
         features_dc = self._features_dc
         features_rest = self._features_rest
-        return torch.cat((features_dc, features_rest), dim=1)
+        return self._get_derived("features", (features_dc, features_rest),
+                                 lambda: torch.cat((features_dc, features_rest), dim=1))
 
     @property
     def get_colors(self):
@@ -68,17 +116,34 @@ class GaussianModel:
 
     @property
     def get_spherical_harmonics(self):
-        return self._features_rest.flatten(start_dim=1)
+        return self._get_derived("spherical_harmonics", (self._features_rest,),
+                                 lambda: self._features_rest.flatten(start_dim=1))
 
     @property
     def get_opacity_with_activation(self):
-        return self.opacity_activation(self._opacity)
+        return self._get_derived("opacity", (self._opacity,), lambda: self.opacity_activation(self._opacity))
 
     @property
     def get_raw_opacity(self):
         return self._opacity
 
+    @property
+    def get_importance(self):
+        return self._get_derived("importance", (self._opacity, self._covariance), self._compute_importance)
+
+    def _compute_importance(self):
+        # Opacity times the volume of the splat, which is proportional to the square root of det(covariance)
+        c = self._covariance
+        determinant = (c[:, 0] * (c[:, 3] * c[:, 5] - c[:, 4] * c[:, 4]) -
+                       c[:, 1] * (c[:, 1] * c[:, 5] - c[:, 4] * c[:, 2]) +
+                       c[:, 2] * (c[:, 1] * c[:, 4] - c[:, 3] * c[:, 2]))
+        return self.get_opacity_with_activation.view(-1) * torch.sqrt(determinant.clamp(min=0))
+
     def get_full_covariance(self, scaling_modifier=1.0):
+        return self._get_derived(("full_covariance", scaling_modifier), (self._covariance,),
+                                 lambda: self._compute_full_covariance(scaling_modifier))
+
+    def _compute_full_covariance(self, scaling_modifier):
         full_covariance = rebuild_lowerdiag(self._covariance)
         if scaling_modifier == 1:
             return full_covariance
@@ -90,53 +155,167 @@ class GaussianModel:
         if scaling_modifier == 1:
             return self._covariance
 
+        return self._get_derived(("covariance", scaling_modifier), (self._covariance,),
+                                 lambda: self._compute_covariance(scaling_modifier))
+
+    def _compute_covariance(self, scaling_modifier):
         transformation_matrix = torch.diag_embed(torch.tensor([scaling_modifier] * 3)).to(self._covariance.device)
         transformed_covariances = (transformation_matrix @ self.get_full_covariance(scaling_modifier) @
                                    transformation_matrix.T)
         return strip_symmetric(transformed_covariances)
 
+    @staticmethod
+    def get_buffer_layout(sh_degree):
+        """
+        Returns the (start, end) columns of the attributes in the packed buffer. The columns follow the PLY vertex
+        records without the normals (the SH coefficients are stored channel by channel), followed by the covariance.
+        """
+        widths = {"_xyz": 3, "_features_dc": 3, "_features_rest": 3 * ((sh_degree + 1) ** 2 - 1), "_opacity": 1,
+                  "_scaling": 3, "_rotation": 4, "_covariance": 6}
+        layout = {}
+        start = 0
+        for attribute_name in GaussianModel.attribute_names:
+            layout[attribute_name] = (start, start + widths[attribute_name])
+            start += widths[attribute_name]
+
+        return layout
+
+    @staticmethod
+    def create_buffer(point_count, sh_degree, device_name="cpu", path=None):
+        """
+        Allocates an uninitialized packed buffer. If a path is given, the buffer is backed by a memory-mapped file
+        instead, so the operating system can page it out. Memory-mapped buffers can only be created on the CPU.
+        """
+        column_count = GaussianModel.get_buffer_layout(sh_degree)["_covariance"][1]
+        if path is None:
+            return torch.empty((point_count, column_count), dtype=torch.float, device=device_name)
+
+        if torch.device(device_name).type != "cpu":
+            raise ValueError(f"Memory-mapped buffers can not be created on {device_name}.")
+
+        array = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(point_count, column_count))
+        return torch.from_numpy(array)
+
+    def get_point_count(self):
+        return self._xyz.shape[0]
+
+    @property
+    def is_packed(self):
+        # Assigning a new tensor to any of the attributes detaches it from the buffer
+        return self._buffer is not None and all(getattr(self, attribute_name)._base is self._buffer
+                                                for attribute_name in GaussianModel.attribute_names)
+
+    def pack(self):
+        """Moves every attribute into a single buffer, if they are not there already."""
+        if not self.is_packed:
+            self._bind_buffer(self.get_packed_buffer())
+
+    def get_packed_buffer(self):
+        """Returns the packed buffer of the model. The buffer is assembled with a single copy if it is not packed."""
+        if self.is_packed:
+            return self._buffer
+
+        return self.get_block(0, self.get_point_count())
+
+    def get_block(self, start, end):
+        """
+        Returns the rows of the packed buffer between start and end. The rows of a packed model are a view of its
+        buffer, otherwise they are assembled from the attributes.
+        """
+        return self.get_rows(slice(start, end))
+
+    def get_rows(self, rows):
+        """Returns the rows of the packed buffer selected by a slice or a tensor of indices."""
+        if self.is_packed:
+            return self._buffer[rows]
+
+        return torch.cat([self._get_attribute_rows(attribute_name, rows)
+                          for attribute_name in GaussianModel.attribute_names], dim=1).to(torch.float)
+
+    def _get_attribute_rows(self, attribute_name, rows):
+        # The rows of the attribute, in the column order of the packed buffer
+        values = getattr(self, attribute_name)[rows]
+        match attribute_name:
+            case "_features_dc":
+                return values.flatten(start_dim=1)
+            case "_features_rest":
+                return values.transpose(1, 2).flatten(start_dim=1)
+
+        return values
+
+    def _bind_buffer(self, buffer):
+        # The cached tensors are derived from the previous attribute tensors, which are released here
+        self.clear_derived_cache()
+        self._buffer = buffer
+        point_count = buffer.shape[0]
+        for attribute_name, (start, end) in self.get_buffer_layout(self.sh_degree).items():
+            columns = buffer[:, start:end]
+            match attribute_name:
+                case "_features_dc":
+                    columns = columns.view(point_count, 1, 3)
+                case "_features_rest":
+                    columns = columns.view(point_count, 3, (end - start) // 3).transpose(1, 2)
+            setattr(self, attribute_name, columns)
+
     def from_ply(self, plydata):
-        xyz = np.stack((np.asarray(plydata.elements[0]["x"]),
-                        np.asarray(plydata.elements[0]["y"]),
-                        np.asarray(plydata.elements[0]["z"])), axis=1)
-        opacities = np.asarray(plydata.elements[0]["opacity"])[..., np.newaxis]
-
-        features_dc = np.zeros((xyz.shape[0], 3, 1))
-        features_dc[:, 0, 0] = np.asarray(plydata.elements[0]["f_dc_0"])
-        features_dc[:, 1, 0] = np.asarray(plydata.elements[0]["f_dc_1"])
-        features_dc[:, 2, 0] = np.asarray(plydata.elements[0]["f_dc_2"])
-
-        extra_f_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("f_rest_")]
-        extra_f_names = sorted(extra_f_names, key=lambda x: int(x.split('_')[-1]))
-        sh_length = len(extra_f_names)
-        self.sh_degree = int(((sh_length + 3) / 3) ** 0.5 - 1)
-        features_extra = np.zeros((xyz.shape[0], len(extra_f_names)))
-        for idx, attr_name in enumerate(extra_f_names):
-            features_extra[:, idx] = np.asarray(plydata.elements[0][attr_name])
-        # Reshape (P,F*SH_coefficients) to (P, F, SH_coefficients except DC)
-        features_extra = features_extra.reshape((features_extra.shape[0], 3, (self.sh_degree + 1) ** 2 - 1))
-
-        scale_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("scale_")]
-        scale_names = sorted(scale_names, key=lambda x: int(x.split('_')[-1]))
-        scales = np.zeros((xyz.shape[0], len(scale_names)))
-        for idx, attr_name in enumerate(scale_names):
-            scales[:, idx] = np.asarray(plydata.elements[0][attr_name])
-
-        rot_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("rot")]
-        rot_names = sorted(rot_names, key=lambda x: int(x.split('_')[-1]))
-        rots = np.zeros((xyz.shape[0], len(rot_names)))
-        for idx, attr_name in enumerate(rot_names):
-            rots[:, idx] = np.asarray(plydata.elements[0][attr_name])
-
-        self._xyz = torch.tensor(xyz, dtype=torch.float, device=self.device_name)
-        self._features_dc = (torch.tensor(features_dc, dtype=torch.float, device=self.device_name)
-                             .transpose(1, 2).contiguous())
-        self._features_rest = (torch.tensor(features_extra, dtype=torch.float, device=self.device_name).
-                               transpose(1, 2).contiguous())
-        self._opacity = torch.tensor(opacities, dtype=torch.float, device=self.device_name)
-        self._scaling = torch.tensor(scales, dtype=torch.float, device=self.device_name)
-        self._rotation = torch.tensor(rots, dtype=torch.float, device=self.device_name)
-        self._covariance = self.covariance_activation(self.get_scaling, 1.0, self._rotation)
+        # The vertex block is reinterpreted as a single (N, P) float32 array (a view of the memory-mapped file when
+        # possible), the attribute groups are strided views of it and they are copied once, into the packed buffer.
+        block, names = get_vertex_block(plydata.elements[0].data)
+        self.sh_degree = self.get_sh_degree_from_names(names)
+        layout = self.get_buffer_layout(self.sh_degree)
+
+        buffer = torch.empty((block.shape[0], layout["_covariance"][1]), dtype=torch.float, device=self.device_name)
+        for attribute_name, (start, end) in layout.items():
+            if attribute_name != "_covariance":
+                buffer[:, start:end] = torch.from_numpy(self._get_attribute_columns(block, names, attribute_name))
+
+        self._bind_buffer(buffer)
+        self._covariance.copy_(self.covariance_activation(self.get_scaling, 1.0, self._rotation))
+
+    @staticmethod
+    def get_sh_degree_from_names(names):
+        sh_length = len(get_property_indices(names, "f_rest_"))
+        return int(((sh_length + 3) / 3) ** 0.5 - 1)
+
+    @staticmethod
+    def _get_attribute_columns(block, names, attribute_name):
+        """Returns the columns of the vertex block that hold the attribute, in the column order of the buffer."""
+        match attribute_name:
+            case "_xyz":
+                indices = [names.index("x"), names.index("y"), names.index("z")]
+            case "_features_dc":
+                indices = get_property_indices(names, "f_dc_")
+            case "_features_rest":
+                indices = get_property_indices(names, "f_rest_")
+            case "_opacity":
+                indices = [names.index("opacity")]
+            case "_scaling":
+                indices = get_property_indices(names, "scale_")
+            case "_rotation":
+                indices = get_property_indices(names, "rot")
+            case _:
+                raise ValueError(f"{attribute_name} is not stored in the PLY file.")
+
+        return get_columns(block, indices)
+
+    def _decode_attribute(self, block, names, attribute_name):
+        if attribute_name == "_covariance":
+            return self.covariance_activation(self.get_scaling, 1.0, self._rotation)
+
+        columns = self._get_attribute_columns(block, names, attribute_name)
+        match attribute_name:
+            case "_features_dc":
+                return self._tensor_from_columns(columns).unsqueeze(1)
+            case "_features_rest":
+                # Reshape (P,F*SH_coefficients) to (P, F, SH_coefficients except DC)
+                features_extra = columns.reshape((block.shape[0], 3, (self.sh_degree + 1) ** 2 - 1))
+                return self._tensor_from_columns(np.swapaxes(features_extra, 1, 2))
+
+        return self._tensor_from_columns(columns)
+
+    def _tensor_from_columns(self, columns):
+        # Strided numpy views are copied exactly once, directly into a contiguous tensor on the target device
+        return torch.from_numpy(columns).to(device=self.device_name, dtype=torch.float, copy=True).contiguous()
 
     def from_mixture(self, gaussian_mixture: GaussianMixtureModel, sh_degree: int):
         self.sh_degree = sh_degree
@@ -153,40 +332,77 @@ class GaussianModel:
         self._rotation = matrices_to_quaternions(eigenvectors)
 
     def construct_list_of_attributes(self):
+        # The attributes are derived from the SH degree, so a lazy model does not decode any of them
         attribute_list = ['x', 'y', 'z', 'nx', 'ny', 'nz']
         # All channels except the 3 DC
-        for i in range(self._features_dc.shape[1] * self._features_dc.shape[2]):
+        for i in range(3):
             attribute_list.append('f_dc_{}'.format(i))
-        for i in range(self._features_rest.shape[1] * self._features_rest.shape[2]):
+        for i in range(3 * ((self.sh_degree + 1) ** 2 - 1)):
             attribute_list.append('f_rest_{}'.format(i))
         attribute_list.append('opacity')
-        for i in range(self._scaling.shape[1]):
+        for i in range(3):
             attribute_list.append('scale_{}'.format(i))
-        for i in range(self._rotation.shape[1]):
+        for i in range(4):
             attribute_list.append('rot_{}'.format(i))
         return attribute_list
 
-    def save_ply(self, path):
-        xyz = self._xyz.detach().cpu().numpy()
-        normals = np.zeros_like(xyz)
-        f_dc = self._features_dc.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
-        f_rest = self._features_rest.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
-        opacities = self._opacity.detach().cpu().numpy()
-        scale = self._scaling.detach().cpu().numpy()
-        rotation = self._rotation.detach().cpu().numpy()
+    def save_ply(self, path, chunk_size=BLOCK_SIZE):
+        # The splats are written in the order of the loaded file, even if they have been sorted spatially
+        point_count = self.get_point_count()
+        file_order = self.get_file_order()
+        blocks = (self.get_ordered_block(file_order, start, start + chunk_size)
+                  for start in range(0, point_count, chunk_size))
+        write_vertex_blocks(path, point_count, self.construct_list_of_attributes(),
+                            self._get_ply_records(blocks, self.sh_degree))
 
-        dtype_full = [(attribute, 'f4') for attribute in self.construct_list_of_attributes()]
+    @staticmethod
+    def _get_ply_records(blocks, sh_degree):
+        # The packed rows already hold the vertex records, apart from the normals and the trailing covariance
+        records_end = GaussianModel.get_buffer_layout(sh_degree)["_rotation"][1]
+        for block in blocks:
+            block = block.detach()
+            normals = torch.zeros((block.shape[0], 3), dtype=block.dtype, device=block.device)
+            yield torch.cat((block[:, :3], normals, block[:, 3:records_end]), dim=1).cpu().numpy()
 
-        elements = np.empty(xyz.shape[0], dtype=dtype_full)
-        attributes = np.concatenate((xyz, normals, f_dc, f_rest, opacities, scale, rotation), axis=1)
-        elements[:] = list(map(tuple, attributes))
-        el = PlyElement.describe(elements, 'vertex')
-        plydata = PlyData([el])
-        plydata.write(path)
+    @staticmethod
+    def save_merged_ply(gaussian1, gaussian2, transformation_matrix, path, chunk_size=BLOCK_SIZE):
+        """
+        Writes the merge of the two models into a PLY file block by block, without building the merged model.
+        Only a single block of the first model is copied and transformed at a time, so the peak memory on top of
+        the two models is bounded by the block size.
+        """
+        assert gaussian1.sh_degree == gaussian2.sh_degree
+        transformation = None
+        if not is_identity_transformation(transformation_matrix):
+            transformation = torch.from_numpy(np.asarray(transformation_matrix, dtype=np.float32))
+
+        def get_blocks():
+            first_order = gaussian1.get_file_order()
+            for start in range(0, gaussian1.get_point_count(), chunk_size):
+                block = gaussian1.get_ordered_block(first_order, start, start + chunk_size)
+                if transformation is not None:
+                    # The rows of a packed model are views of its buffer, which must be left untouched
+                    block = block.clone() if gaussian1.is_packed and first_order is None else block
+                    GaussianModel.transform_block(block, transformation, gaussian1.sh_degree)
+                yield block
+
+            second_order = gaussian2.get_file_order()
+            for start in range(0, gaussian2.get_point_count(), chunk_size):
+                yield gaussian2.get_ordered_block(second_order, start, start + chunk_size)
+
+        write_vertex_blocks(path, gaussian1.get_point_count() + gaussian2.get_point_count(),
+                            gaussian1.construct_list_of_attributes(),
+                            GaussianModel._get_ply_records(get_blocks(), gaussian1.sh_degree))
 
     def clone_gaussian(self):
-        new_model = GaussianModel()
+        new_model = GaussianModel(self.device_name)
         new_model.sh_degree = self.sh_degree
+        if self.original_indices is not None:
+            new_model.original_indices = self.original_indices.clone()
+        if self.is_packed:
+            new_model._bind_buffer(self._buffer.clone().detach())
+            return new_model
+
         new_model._covariance = self._covariance.clone().detach()
         new_model._xyz = self._xyz.clone().detach()
         new_model._rotation = self._rotation.clone().detach()
@@ -196,6 +412,73 @@ class GaussianModel:
         new_model._opacity = self._opacity.clone().detach()
         return new_model
 
+    def select_by_index(self, indices):
+        """Returns a new, packed model of the splats at the indices, in the order of the indices."""
+        indices = torch.as_tensor(indices, dtype=torch.long)
+        new_model = GaussianModel(self.device_name)
+        new_model.sh_degree = self.sh_degree
+        new_model.original_indices = torch.as_tensor(self.get_original_indices(indices), dtype=torch.long).cpu()
+        new_model._bind_buffer(self.get_rows(indices.to(self.device_name)).clone())
+        return new_model
+
+    def build_lod_levels(self, fractions=LOD_FRACTIONS):
+        """
+        Returns a level of detail for every fraction: the given fraction of the splats with the highest importance
+        (opacity times volume). The levels are nested, every level contains the splats of the smaller ones, and the
+        splats keep their current order.
+        """
+        point_count = self.get_point_count()
+        order = torch.argsort(self.get_importance, descending=True, stable=True)
+
+        levels = []
+        for fraction in fractions:
+            count = min(max(int(round(fraction * point_count)), 1), point_count)
+            levels.append(self.select_by_index(torch.sort(order[:count]).values.cpu()))
+
+        return levels
+
+    def reorder(self, order):
+        """Reorders the splats by the permutation. The original index of every splat is kept in original_indices."""
+        self.clear_derived_cache()
+        if self.is_packed:
+            self._bind_buffer(self._buffer[order.to(self._buffer.device)])
+        else:
+            for attribute_name in GaussianModel.attribute_names:
+                tensor = getattr(self, attribute_name)
+                setattr(self, attribute_name, tensor[order.to(tensor.device)])
+
+        # The permutation is kept on the CPU, independently of the device of the model
+        order = order.cpu()
+        self.original_indices = order if self.original_indices is None else self.original_indices[order]
+
+    def sort_spatially(self):
+        """
+        Sorts the splats along the Z-order curve of their positions, which improves the memory locality of the
+        neighbor queries, the voxel downsampling and the rasterization.
+        """
+        self.reorder(get_morton_order(self._xyz))
+
+    def get_file_order(self):
+        """Returns the permutation back to the order of the loaded file, or None if the splats are in that order."""
+        if self.original_indices is None:
+            return None
+
+        return torch.argsort(self.original_indices)
+
+    def get_ordered_block(self, order, start, end):
+        """Returns the rows between start and end of the given permutation (see get_file_order) of the splats."""
+        if order is None:
+            return self.get_block(start, end)
+
+        return self.get_rows(order[start:end].to(self.device_name))
+
+    def get_original_indices(self, indices):
+        """Maps splat (e.g. plane) indices of the current order to the indices of the loaded file."""
+        if self.original_indices is None:
+            return indices
+
+        return self.original_indices[torch.as_tensor(indices, dtype=torch.long)]
+
     def quat_multiply(self, quaternion0, quaternion1):
         w0, x0, y0, z0 = torch.chunk(quaternion0, 4, dim=-1)
         w1, x1, y1, z1 = torch.chunk(quaternion1, 4, dim=-1)
@@ -208,83 +491,171 @@ class GaussianModel:
         ), dim=-1)
 
     def transform_gaussian_model(self, transformation_matrix):
-        rotation_matrix = transformation_matrix[:3, :3]
-        self._xyz = torch.matmul(self._xyz, rotation_matrix.T)
-        self._xyz += transformation_matrix[:3, 3]
-
-        transformed_covariances = rotation_matrix @ self.get_full_covariance() @ rotation_matrix.transpose(
-            0, 1)
-        self._covariance = strip_symmetric(transformed_covariances)
+        # The attributes are updated in place, which also keeps a packed model packed
+        transform_splats(self._xyz, self._covariance, self._rotation, transformation_matrix)
+        rotate_sh(self._features_rest, transformation_matrix[:3, :3], self.sh_degree)
 
-        quaternions = matrix_to_quaternion(rotation_matrix).unsqueeze(0).to(self._rotation.device)
-        rotations_from_quats = self.quat_multiply(self._rotation, quaternions)
-        self._rotation = rotations_from_quats / torch.norm(rotations_from_quats, p=2, dim=-1, keepdim=True)
-        pass
+    @staticmethod
+    def transform_block(block, transformation_matrix, sh_degree):
+        """Transforms the splats in the rows of a packed buffer in place."""
+        block_model = GaussianModel(str(block.device))
+        block_model.sh_degree = sh_degree
+        block_model._bind_buffer(block)
+        block_model.transform_gaussian_model(transformation_matrix)
 
     def move_to_device(self, device_name):
         if self.device_name == device_name:
             return
 
         self.device_name = device_name
-        self._xyz = self._xyz.to(device_name)
-        self._features_dc = self._features_dc.to(device_name)
-        self._features_rest = self._features_rest.to(device_name)
-        self._scaling = self._scaling.to(device_name)
-        self._rotation = self._rotation.to(device_name)
-        self._opacity = self._opacity.to(device_name)
-        self._covariance = self._covariance.to(device_name)
+        self.clear_derived_cache()
+        if self.is_packed:
+            self._bind_buffer(self._buffer.to(device_name))
+            return
+
+        for attribute_name in GaussianModel.attribute_names:
+            setattr(self, attribute_name, getattr(self, attribute_name).to(device_name))
+
+    def decompose_covariance_matrix(self):
+        """
+        Decomposes the covariances into their sorted eigenvalues and a rotation matrix of the eigenvectors. The signs
+        of the eigenvectors are chosen for the largest trace of the rotation, so the quaternions computed from it by
+        matrices_to_quaternions are well defined.
+        """
+        eigenvalues, eigenvectors = eigh_3x3(self.get_full_covariance())
+
+        # Negating two of the eigenvectors keeps the basis right-handed, the trace of the best of the four candidates
+        # is never negative
+        signs = torch.tensor([[1, 1, 1], [-1, -1, 1], [-1, 1, -1], [1, -1, -1]], dtype=eigenvectors.dtype,
+                             device=eigenvectors.device)
+        best = torch.argmax(eigenvectors.diagonal(dim1=1, dim2=2) @ signs.T, dim=1)
+        return eigenvalues, eigenvectors * signs[best][:, None, :]
+
+    @staticmethod
+    def get_merged_gaussian_point_clouds(gaussian1, gaussian2, transformation_matrix):
+        return MergedGaussianModel(gaussian1, gaussian2, transformation_matrix)
 
+
+def is_identity_transformation(transformation_matrix):
+    return (transformation_matrix is None or
+            np.array_equal(transformation_matrix, np.eye(transformation_matrix.shape[0])))
+
+
+class MergedGaussianModel(GaussianModel):
     """
-    Executes eigendecomposition of the covariance matrix. The function is not used, but left in for completeness.
-    Hopefully no one wants to save a downscaled gaussian model.
+    Merged view of two Gaussian models, the first one transformed by the given matrix. The concatenation of the
+    two models is built once, block by block, optionally in a memory-mapped buffer at buffer_path. Setting a new
+    transformation only rewrites the rows of the first model, and setting the current one again does nothing.
+    If file_order is set, the splats of both models are in the order of their loaded files (e.g. for an export).
     """
 
-    def decompose_covariance_matrix(self):
-        eigenvalues, eigenvectors = torch.linalg.eigh(self.get_full_covariance())
+    def __init__(self, first, second, transformation_matrix=None, buffer_path=None, chunk_size=BLOCK_SIZE,
+                 file_order=False):
+        super().__init__(first.device_name)
+        assert first.sh_degree == second.sh_degree
+        self.first = first
+        self.second = second
+        self.sh_degree = first.sh_degree
+        self.chunk_size = chunk_size
+        # None if the first model is not transformed
+        self.transformation_matrix = None
+        self.first_order = first.get_file_order() if file_order else None
+        self.second_order = second.get_file_order() if file_order else None
+
+        first_count = first.get_point_count()
+        self._bind_buffer(self.create_buffer(first_count + second.get_point_count(), self.sh_degree,
+                                             self.device_name, buffer_path))
+        self._copy_rows(second, self.second_order, first_count)
+        if is_identity_transformation(transformation_matrix):
+            self._copy_rows(first, self.first_order, 0)
+        else:
+            self.set_transformation(transformation_matrix)
+
+    def _copy_rows(self, source, order, offset):
+        for start in range(0, source.get_point_count(), self.chunk_size):
+            block = source.get_ordered_block(order, start, start + self.chunk_size)
+            self._buffer[offset + start:offset + start + block.shape[0]] = block
+
+    def set_transformation(self, transformation_matrix):
+        if is_identity_transformation(transformation_matrix):
+            if self.transformation_matrix is None:
+                return
+
+            self.transformation_matrix = None
+            self._copy_rows(self.first, self.first_order, 0)
+            return
+
+        if self.transformation_matrix is not None and np.array_equal(transformation_matrix, self.transformation_matrix):
+            return
+
+        # The new matrix replaces the previous one and it is applied to the untransformed first model, so consecutive
+        # edits cost a single pass each and do not accumulate rounding errors
+        self.transformation_matrix = np.array(transformation_matrix, copy=True)
+        transformation = torch.from_numpy(self.transformation_matrix.astype(np.float32))
+        first_count = self.first.get_point_count()
+        for start in range(0, first_count, self.chunk_size):
+            rows = self._buffer[start:min(start + self.chunk_size, first_count)]
+            rows.copy_(self.first.get_ordered_block(self.first_order, start, start + rows.shape[0]))
+            self.transform_block(rows, transformation, self.sh_degree)
 
-        # Standard basis vectors for x, y, z axes
-        x_axis = torch.tensor([1, 0, 0], dtype=torch.float32, device=self.device_name)
-        y_axis = torch.tensor([0, 1, 0], dtype=torch.float32, device=self.device_name)
-        z_axis = torch.tensor([0, 0, 1], dtype=torch.float32, device=self.device_name)
 
-        axes = torch.stack([x_axis, y_axis, z_axis])
+class LazyGaussianModel(GaussianModel):
+    """
+    Gaussian model backed by a memory-mapped PLY file. Every attribute group is only decoded on its first access,
+    so e.g. the spherical harmonics are never read for a registration-only session.
+    """
+
+    def __init__(self, device_name="cpu"):
+        super().__init__(device_name)
+        self._vertex_block = None
+        self._property_names = None
 
-        # Compute dot products to determine the correspondence of each eigenvector
-        dot_products = torch.abs(torch.matmul(eigenvectors.transpose(1, 2), axes.T))
+    def __getattr__(self, name):
+        # Only called if the attribute has not been decoded yet
+        if name not in GaussianModel.attribute_names or self.__dict__.get("_vertex_block") is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
 
-        # Get the indices that would sort each eigenvector to align with x, y, z axes
-        correspondence = torch.argmax(dot_products, dim=2)
+        value = self._decode_attribute(self._vertex_block, self._property_names, name)
+        setattr(self, name, value)
+        return value
 
-        # Reorder eigenvalues and eigenvectors accordingly
-        sorted_eigenvalues = torch.zeros_like(eigenvalues)
-        sorted_eigenvectors = torch.zeros_like(eigenvectors)
+    def from_ply(self, plydata):
+        self.clear_derived_cache()
+        self._vertex_block, self._property_names = get_vertex_block(plydata.elements[0].data)
+        self.sh_degree = self.get_sh_degree_from_names(self._property_names)
 
-        sorted_eigenvalues.scatter_(1, correspondence, eigenvalues)
-        sorted_eigenvectors.scatter_(1, correspondence.unsqueeze(-1).expand(-1, -1, 3), eigenvectors)
+        for attribute_name in GaussianModel.attribute_names:
+            self.__dict__.pop(attribute_name, None)
 
-        return sorted_eigenvalues, sorted_eigenvectors
+    def is_decoded(self, attribute_name):
+        return attribute_name in self.__dict__
 
-    @staticmethod
-    def get_merged_gaussian_point_clouds(gaussian1, gaussian2, transformation_matrix):
-        merged_pc = GaussianModel()
-        gaussian1_copy = gaussian1
+    def get_point_count(self):
+        if self._vertex_block is not None:
+            return self._vertex_block.shape[0]
 
-        # If the transformation matrix is not an identity matrix
-        if (transformation_matrix is not None and
-                not np.array_equal(transformation_matrix, np.eye(transformation_matrix.shape[0]))):
-            transformation_matrix_tensor = (torch.from_numpy(transformation_matrix.astype(np.float32))
-                                            .to(gaussian1.device_name))
-            gaussian1_copy = gaussian1.clone_gaussian()
-            gaussian1_copy.transform_gaussian_model(transformation_matrix_tensor)
+        return super().get_point_count()
 
-        assert gaussian1.sh_degree == gaussian2.sh_degree
-        merged_pc.sh_degree = gaussian1.sh_degree
-        merged_pc._xyz = torch.cat((gaussian1_copy._xyz, gaussian2._xyz))
-        merged_pc._rotation = torch.cat((gaussian1_copy._rotation, gaussian2._rotation))
-        merged_pc._scaling = torch.cat((gaussian1_copy._scaling, gaussian2._scaling))
-        merged_pc._features_dc = torch.cat((gaussian1_copy._features_dc, gaussian2._features_dc))
-        merged_pc._features_rest = torch.cat((gaussian1_copy._features_rest, gaussian2._features_rest))
-        merged_pc._opacity = torch.cat((gaussian1_copy._opacity, gaussian2._opacity))
-        merged_pc._covariance = torch.cat((gaussian1_copy._covariance, gaussian2._covariance))
-
-        return merged_pc
+    def _get_attribute_rows(self, attribute_name, rows):
+        # Attributes that have not been decoded are read from the rows of the mapped file, without decoding them
+        if self.is_decoded(attribute_name) or self._vertex_block is None:
+            return super()._get_attribute_rows(attribute_name, rows)
+
+        if attribute_name == "_covariance":
+            scaling = self.scaling_activation(self._get_attribute_rows("_scaling", rows))
+            return self.covariance_activation(scaling, 1.0, self._get_attribute_rows("_rotation", rows))
+
+        block_rows = rows.cpu().numpy() if isinstance(rows, torch.Tensor) else rows
+        columns = self._get_attribute_columns(self._vertex_block[block_rows], self._property_names, attribute_name)
+        return self._tensor_from_columns(columns)
+
+    def move_to_device(self, device_name):
+        if self.device_name == device_name:
+            return
+
+        # Attributes that are decoded later on are created directly on the new device
+        self.device_name = device_name
+        self.clear_derived_cache()
+        for attribute_name in GaussianModel.attribute_names:
+            if self.is_decoded(attribute_name):
+                setattr(self, attribute_name, getattr(self, attribute_name).to(device_name))
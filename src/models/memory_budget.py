@@ -0,0 +1,296 @@
+"""
+Memory accounting for the point cloud lists of the data repository. The least recently used entries are spilled to
+uncompressed numpy files once the resident entries exceed the budget, and they are loaded back on their next access.
+"""
+
+import ctypes
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import MutableSequence
+
+import numpy as np
+import open3d as o3d
+import torch
+
+from src.models.gaussian_model import GaussianModel
+from src.utils.point_cloud_cache import get_point_cloud_arrays, create_point_cloud_from_arrays
+
+
+class MemoryStatusEx(ctypes.Structure):
+    # MEMORYSTATUSEX of the Windows API
+    _fields_ = [("dwLength", ctypes.c_uint32), ("dwMemoryLoad", ctypes.c_uint32),
+                ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+
+def get_physical_memory():
+    """Returns the size of the physical memory in bytes, or None if it can not be queried on this platform."""
+    if sys.platform == "win32":
+        status = MemoryStatusEx()
+        status.dwLength = ctypes.sizeof(MemoryStatusEx)
+        if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return None
+        return status.ullTotalPhys
+
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def get_default_budget():
+    physical_memory = get_physical_memory()
+    return None if physical_memory is None else physical_memory // 2
+
+
+def get_tensor_footprint(tensors):
+    # Views share the storage of their base tensor (e.g. the attributes of a packed model), it is only counted once
+    storages = {}
+    for tensor in tensors:
+        if isinstance(tensor, torch.Tensor):
+            storage = tensor.untyped_storage()
+            storages[(storage.device, storage.data_ptr())] = storage.nbytes()
+
+    return sum(storages.values())
+
+
+def get_footprint(item):
+    """
+    Returns the number of bytes held by a Gaussian model (including its derived tensors) or an Open3D point cloud. The
+    positions of a tensor point cloud are not counted, they are shared with its Gaussian model.
+    """
+    if isinstance(item, GaussianModel):
+        # Attributes of a lazy model that have not been decoded are not in the instance dictionary
+        tensors = [item.__dict__[name] for name in GaussianModel.attribute_names if name in item.__dict__]
+        for _, _, value in item._derived_cache.values():
+            tensors.extend(value if isinstance(value, tuple) else (value,))
+        return get_tensor_footprint(tensors)
+
+    if isinstance(item, o3d.geometry.PointCloud):
+        return sum(array.nbytes for array in get_point_cloud_arrays(item).values())
+
+    if isinstance(item, o3d.t.geometry.PointCloud):
+        return sum(item.point[name].num_elements() * item.point[name].dtype.byte_size()
+                   for name in item.point if name != "positions")
+
+    return 0
+
+
+def is_spillable(item):
+    # Lazy and merged models are views of other data, spilling them would decode or duplicate it
+    return type(item) is GaussianModel or isinstance(item, o3d.geometry.PointCloud)
+
+
+def is_referenced_elsewhere(entry):
+    # The entry and the argument of getrefcount hold the only references to an item that is not used elsewhere (e.g.
+    # by the viewer or a worker). Spilling a used item would free nothing and reloading it would create a copy.
+    return sys.getrefcount(entry.item) > 2
+
+
+class ManagedEntry:
+    def __init__(self, item):
+        if isinstance(item, GaussianModel):
+            # The derived tensors of a stored model are recomputed on demand instead of being kept with it
+            item.set_derived_caching(False)
+        self.item = item
+        self.footprint = get_footprint(item)
+        # Path of the spilled data, if the item is not resident
+        self.spill_path = None
+        self.spill_state = None
+
+    @property
+    def is_resident(self):
+        # Placeholder entries hold None, but they are not spilled
+        return self.spill_path is None
+
+    def spill(self, directory):
+        if isinstance(self.item, GaussianModel):
+            self.spill_path = os.path.join(directory, f"{id(self)}.npy")
+            np.save(self.spill_path, self.item.get_packed_buffer().detach().cpu().numpy())
+            self.spill_state = (self.item.sh_degree, self.item.device_name, self.item.original_indices)
+        else:
+            self.spill_path = os.path.join(directory, f"{id(self)}.npz")
+            np.savez(self.spill_path, **get_point_cloud_arrays(self.item))
+            self.spill_state = None
+
+        self.item = None
+
+    def reload(self):
+        if self.spill_path.endswith(".npy"):
+            sh_degree, device_name, original_indices = self.spill_state
+            item = GaussianModel(device_name)
+            item.sh_degree = sh_degree
+            item.original_indices = original_indices
+            item._bind_buffer(torch.from_numpy(np.load(self.spill_path)).to(device_name))
+        else:
+            with np.load(self.spill_path) as arrays:
+                item = create_point_cloud_from_arrays(arrays)
+
+        self.remove_spill_file()
+        self.item = item
+
+    def remove_spill_file(self):
+        if self.spill_path is not None:
+            try:
+                os.remove(self.spill_path)
+            except FileNotFoundError:
+                pass
+        self.spill_path = None
+        self.spill_state = None
+
+
+class MemoryBudget:
+    """
+    Tracks the footprint of the entries of every managed list. If the resident entries exceed the budget (in bytes,
+    None for no limit), the least recently used ones are spilled to the spill directory.
+    """
+
+    def __init__(self, budget=None, spill_directory=None):
+        self.budget = budget
+        self._spill_directory = spill_directory
+        self._owns_spill_directory = spill_directory is None
+        # Resident entries, from the least to the most recently used one
+        self._resident_entries = OrderedDict()
+        # The lists are also accessed from worker threads (e.g. the multi-scale registration)
+        self.lock = threading.RLock()
+        # Caches of converted point clouds, which are accounted for but not spilled
+        self._caches = []
+
+    @property
+    def spill_directory(self):
+        if self._spill_directory is None:
+            self._spill_directory = tempfile.mkdtemp(prefix="gaussian_registration_")
+        os.makedirs(self._spill_directory, exist_ok=True)
+        return self._spill_directory
+
+    def get_resident_size(self):
+        return sum(entry.footprint for entry in self._resident_entries.values()) + self.get_cache_size()
+
+    def register_cache(self, cache):
+        """Accounts for the point clouds of a cache that provides get_footprint (e.g. Open3DConversionCache)."""
+        with self.lock:
+            self._caches.append(cache)
+
+    def get_cache_size(self):
+        return sum(cache.get_footprint() for cache in self._caches)
+
+    def add(self, entry):
+        with self.lock:
+            self._resident_entries[id(entry)] = entry
+            self.enforce(entry)
+
+    def access(self, entry):
+        with self.lock:
+            if not entry.is_resident:
+                entry.reload()
+
+            # The footprint is refreshed, the item may have been moved or extended since the last access
+            entry.footprint = get_footprint(entry.item)
+            self._resident_entries[id(entry)] = entry
+            self._resident_entries.move_to_end(id(entry))
+            self.enforce(entry)
+            return entry.item
+
+    def discard(self, entry):
+        with self.lock:
+            self._resident_entries.pop(id(entry), None)
+            entry.remove_spill_file()
+            entry.item = None
+
+    def enforce(self, protected_entry=None):
+        """
+        Spills the least recently used entries until the resident ones fit into the budget. Entries whose items are
+        still used outside of their list are kept resident.
+        """
+        if self.budget is None:
+            return
+
+        with self.lock:
+            resident_size = self.get_resident_size()
+            for key, entry in list(self._resident_entries.items()):
+                if resident_size <= self.budget:
+                    break
+
+                if entry is protected_entry or not is_spillable(entry.item) or is_referenced_elsewhere(entry):
+                    continue
+
+                resident_size -= entry.footprint
+                entry.spill(self.spill_directory)
+                del self._resident_entries[key]
+
+    def close(self):
+        if self._owns_spill_directory and self._spill_directory is not None:
+            shutil.rmtree(self._spill_directory, ignore_errors=True)
+            self._spill_directory = None
+
+
+class ManagedList(MutableSequence):
+    """List of point clouds, whose entries are accounted for and possibly spilled by the memory budget."""
+
+    def __init__(self, memory_budget: MemoryBudget, name=""):
+        self.memory_budget = memory_budget
+        self.name = name
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, index):
+        with self.memory_budget.lock:
+            if isinstance(index, slice):
+                return [self.memory_budget.access(entry) for entry in self._entries[index]]
+
+            return self.memory_budget.access(self._entries[index])
+
+    def __setitem__(self, index, item):
+        if isinstance(index, slice):
+            raise TypeError("Slice assignment is not supported, use replace instead.")
+
+        with self.memory_budget.lock:
+            self.memory_budget.discard(self._entries[index])
+            self._entries[index] = ManagedEntry(item)
+            self.memory_budget.add(self._entries[index])
+
+    def __delitem__(self, index):
+        with self.memory_budget.lock:
+            entries = self._entries[index] if isinstance(index, slice) else [self._entries[index]]
+            for entry in entries:
+                self.memory_budget.discard(entry)
+            del self._entries[index]
+
+    def insert(self, index, item):
+        entry = ManagedEntry(item)
+        with self.memory_budget.lock:
+            self._entries.insert(index, entry)
+            self.memory_budget.add(entry)
+
+    def clear(self):
+        # Unlike the default implementation, the spilled entries are not loaded back just to be removed
+        del self[:]
+
+    def replace(self, items):
+        items = list(items)
+        self.clear()
+        self.extend(items)
+
+    def is_resident(self, index):
+        return self._entries[index].is_resident
+
+    def is_placeholder(self, index):
+        """Returns whether the entry holds None, which is never spilled."""
+        return self._entries[index].is_resident and self._entries[index].item is None
+
+    def get_footprints(self):
+        """Returns the last known footprint of every entry, in bytes."""
+        return [entry.footprint for entry in self._entries]
+
+    def get_summary(self):
+        resident = sum(entry.is_resident for entry in self._entries)
+        total_size = sum(self.get_footprints())
+        return f"{self.name}: {len(self)} point clouds, {resident} resident, {total_size / 1024 ** 2:.1f} MB"
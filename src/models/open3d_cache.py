@@ -0,0 +1,170 @@
+"""
+Lazy Open3D point clouds of the data repository. The point clouds derived from Gaussian models are only converted when
+they are accessed (e.g. displayed or registered) and the least recently used conversions are dropped.
+"""
+
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import MutableSequence
+
+from src.models.memory_budget import ManagedList, MemoryBudget, get_footprint
+from src.utils.point_cloud_converter import convert_gs_to_open3d_pc, convert_gs_to_tensor_pc, NormalEstimationType
+
+# Number of converted point clouds that are kept, enough for a displayed level of both point clouds and a level that
+# is registered in the background
+OPEN3D_CACHE_SIZE = 4
+
+
+class Open3DConversionCache:
+    """
+    LRU cache of the Open3D point clouds converted from Gaussian models, keyed by the identity of the models and the
+    normal estimation. The point clouds are accounted for by the memory budget, if one is given.
+    """
+
+    def __init__(self, size=OPEN3D_CACHE_SIZE, memory_budget: MemoryBudget = None):
+        self.size = size
+        self.memory_budget = memory_budget
+        # The normal estimation of the loaded point clouds, which the conversions of their levels follow
+        self.normal_estimation = NormalEstimationType.Covariance
+        # The models are only weakly referenced, so the cache does not keep spilled or removed models alive, and
+        # their point clouds are dropped with them
+        self._entries = OrderedDict()
+        # The multi-scale registration accesses the point clouds from its worker thread. The lock is reentrant, since
+        # a model may be collected (which drops its entry) while it is held.
+        self._lock = threading.RLock()
+
+        if memory_budget is not None:
+            memory_budget.register_cache(self)
+
+    def get(self, gaussian):
+        normal_estimation = self.normal_estimation
+        return self._get(gaussian, (id(gaussian), normal_estimation),
+                         lambda model: convert_gs_to_open3d_pc(model, normal_estimation))
+
+    def _lookup(self, gaussian, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0]() is gaussian:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        return None
+
+    def _get(self, gaussian, key, convert):
+        point_cloud = self._lookup(gaussian, key)
+        if point_cloud is not None:
+            return point_cloud
+
+        point_cloud = convert(gaussian)
+        with self._lock:
+            self._entries[key] = (weakref.ref(gaussian, lambda reference: self._drop(key, reference)), point_cloud,
+                                  get_footprint(point_cloud))
+            self._entries.move_to_end(key)
+            self._trim()
+
+        # The conversion may push the resident point clouds over the budget
+        if self.memory_budget is not None:
+            self.memory_budget.enforce()
+
+        return point_cloud
+
+    def reserve(self, count):
+        """
+        Keeps at least count conversions, e.g. every level during a multi-scale registration. Returns the previous
+        size, which should be restored with resize once they are no longer needed.
+        """
+        with self._lock:
+            previous_size = self.size
+            self.size = max(self.size, count)
+            return previous_size
+
+    def resize(self, size):
+        """Sets the number of kept conversions and drops the least recently used ones above it."""
+        with self._lock:
+            self.size = size
+            self._trim()
+
+    def _trim(self):
+        while len(self._entries) > max(self.size, 0):
+            self._entries.popitem(last=False)
+
+    def get_footprint(self):
+        with self._lock:
+            return sum(entry[2] for entry in self._entries.values())
+
+    def _drop(self, key, reference):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is reference:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TensorConversionCache(Open3DConversionCache):
+    """
+    LRU cache of the Open3D tensor point clouds of Gaussian models, so e.g. consecutive plane fits and registrations
+    of a level do not estimate its normals again. A point cloud with normals is also returned if none are requested.
+    The point clouds are shared, they must not be modified in place (see transform_tensor_pc).
+    """
+
+    def get(self, gaussian, estimate_normals=True):
+        normal_estimation = self.normal_estimation
+        point_cloud = self._lookup(gaussian, (id(gaussian), True, normal_estimation))
+        if point_cloud is not None:
+            return point_cloud
+
+        return self._get(gaussian, (id(gaussian), estimate_normals, normal_estimation),
+                         lambda model: convert_gs_to_tensor_pc(model, estimate_normals, normal_estimation))
+
+
+class LazyOpen3DList(MutableSequence):
+    """
+    List of Open3D point clouds. The entries that are None are converted from the Gaussian model at the same index of
+    the Gaussian list on access, the other entries (e.g. the sparse inputs) are stored like in a managed list.
+    """
+
+    def __init__(self, managed_list: ManagedList, gaussian_list: ManagedList, cache: Open3DConversionCache):
+        self.managed_list = managed_list
+        self.gaussian_list = gaussian_list
+        self.cache = cache
+
+    def __len__(self):
+        return len(self.managed_list)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[item_index] for item_index in range(*index.indices(len(self)))]
+
+        point_cloud = self.managed_list[index]
+        if point_cloud is None:
+            gaussian = self.gaussian_list[index]
+            return None if gaussian is None else self.cache.get(gaussian)
+
+        return point_cloud
+
+    def __setitem__(self, index, item):
+        self.managed_list[index] = item
+
+    def __delitem__(self, index):
+        del self.managed_list[index]
+
+    def insert(self, index, item):
+        self.managed_list.insert(index, item)
+
+    def clear(self):
+        self.managed_list.clear()
+
+    def replace(self, items):
+        self.managed_list.replace(items)
+
+    def is_lazy(self, index):
+        """Returns whether the point cloud at the index is converted from its Gaussian model on access."""
+        return self.managed_list.is_placeholder(index)
+
+    def get_summary(self):
+        lazy_count = sum(self.is_lazy(index) for index in range(len(self)))
+        return f"{self.managed_list.get_summary()}, {lazy_count} converted on demand"
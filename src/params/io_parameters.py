@@ -4,6 +4,8 @@ import numpy as np
 import open3d as o3d
 
 from models.gaussian_model import GaussianModel
+from src.models.compact_gaussian_model import SHQuantizationType
+from src.utils.point_cloud_converter import NormalEstimationType, NormalOrientationType
 
 
 @dataclass
@@ -26,6 +28,18 @@ class LoadRequestParams:
     second_path: str
 
     save_converted: bool = False
+    lazy_load: bool = False
+    spatial_sort: bool = False
+    normal_estimation: NormalEstimationType = NormalEstimationType.Covariance
+    normal_orientation: NormalOrientationType = NormalOrientationType.Disabled
+    # Sparse inputs above the streaming threshold of the file loader are read chunk by chunk
+    stream_large_files: bool = True
+    # Subsampling of the streamed loads, a stride of 1 and a voxel size and opacity of 0 keep every point
+    stream_stride: int = 1
+    stream_voxel_size: float = 0.0
+    stream_min_opacity: float = 0.0
+    # Streams only the subsampled point cloud of Gaussian inputs for registration, without their Gaussian models
+    registration_only: bool = False
 
 
 @dataclass
@@ -36,3 +50,5 @@ class SaveRequestParams:
     use_corresponding_pc: bool = False
     first_path: str | None = None
     second_path: str | None = None
+    # Saves the compact, quantized format instead of PLY if set
+    sh_quantization: SHQuantizationType | None = None
@@ -8,3 +8,20 @@ class GaussianMixtureParams:
     color_delta: float = 2.5
     decay_rate: float = 1.0
     cluster_level: int = 3
+
+
+@dataclass
+class LodParams:
+    # Every level keeps 1 / reduction_factor of the splats of the previous one
+    reduction_factor: float = 2.0
+    level_count: int = 3
+
+    def is_valid(self):
+        return self.reduction_factor > 1 and self.level_count >= 1
+
+    def get_fractions(self):
+        if not self.is_valid():
+            raise ValueError(f"Invalid levels of detail: reduction factor {self.reduction_factor}, "
+                             f"{self.level_count} levels.")
+
+        return [self.reduction_factor ** -level for level in range(1, self.level_count + 1)]
@@ -1,7 +1,7 @@
 from dataclasses import dataclass, field
 
 from utils.global_registration_util import RANSACEstimationMethod
-from utils.local_registration_util import LocalRegistrationType, KernelLossFunctionType
+from utils.local_registration_util import LocalRegistrationType, KernelLossFunctionType, LocalRegistrationBackend
 
 
 @dataclass
@@ -13,6 +13,9 @@ class LocalRegistrationParams:
     max_iteration: int = 30
     rejection_type: KernelLossFunctionType = KernelLossFunctionType.Loss_None
     k_value: float = 0.0
+    backend: LocalRegistrationBackend = LocalRegistrationBackend.Legacy
+    # Number of scales of the multi-scale ICP of the tensor backend
+    scale_count: int = 3
 
 
 @dataclass
@@ -0,0 +1,113 @@
+"""
+Readers for the points3D.txt and points3D.bin sparse reconstructions of COLMAP
+"""
+
+import os
+import struct
+
+import numpy as np
+
+COLMAP_POINTS_EXTENSIONS = (".txt", ".bin")
+
+# POINT3D_ID, X, Y, Z, R, G, B, ERROR, followed by the track length and the (IMAGE_ID, POINT2D_IDX) pairs
+COLMAP_POINT_DTYPE = np.dtype([("id", "<u8"), ("xyz", "<f8", 3), ("rgb", "u1", 3), ("error", "<f8"),
+                               ("track_length", "<u8")])
+COLMAP_TRACK_ELEMENT_SIZE = 8
+COLMAP_TRACK_LENGTH_STRUCT = struct.Struct("<Q")
+
+
+COLMAP_POINTS_NAME = "points3d"
+# First line of the points3D.txt files written by COLMAP
+COLMAP_TEXT_HEADER = "# 3D point list"
+
+
+def is_colmap_points_file(path):
+    """Returns whether the file is a points3D file, by its name or else by its header."""
+    name, extension = os.path.splitext(os.path.basename(path))
+    if extension.lower() not in COLMAP_POINTS_EXTENSIONS:
+        return False
+    if name.lower().startswith(COLMAP_POINTS_NAME):
+        return True
+
+    try:
+        return has_colmap_header(path)
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+def has_colmap_header(path):
+    if path.lower().endswith(".bin"):
+        file_size = os.path.getsize(path)
+        if file_size < 8:
+            return False
+        with open(path, "rb") as file:
+            point_count = int(np.fromfile(file, dtype="<u8", count=1)[0])
+        # Every point takes at least its fixed size record
+        return 8 + point_count * COLMAP_POINT_DTYPE.itemsize <= file_size
+
+    with open(path, "r") as file:
+        return file.readline().startswith(COLMAP_TEXT_HEADER)
+
+
+def read_colmap_point_count(path):
+    """Returns the number of points without reading the points, or None if it is not stored in the header."""
+    if path.lower().endswith(".bin"):
+        with open(path, "rb") as file:
+            return int(np.fromfile(file, dtype="<u8", count=1)[0])
+
+    with open(path, "r") as file:
+        for line in file:
+            if not line.startswith("#"):
+                break
+            # Written by COLMAP as "# Number of points: N, mean track length: M"
+            if line.startswith("# Number of points:"):
+                return int(line.split(":")[1].split(",")[0])
+
+    return None
+
+
+def read_colmap_points(path):
+    """Returns the (N, 3) float64 positions and (N, 3) uint8 colors of the points of a points3D.txt or .bin file."""
+    if path.lower().endswith(".bin"):
+        return read_colmap_points_binary(path)
+
+    return read_colmap_points_text(path)
+
+
+def read_colmap_points_text(path):
+    # Only the position and color columns are parsed, the tracks of varying length are skipped
+    values = np.loadtxt(path, dtype=np.float64, comments="#", usecols=range(1, 7), ndmin=2)
+    return values[:, :3], values[:, 3:6].astype(np.uint8)
+
+
+def read_colmap_points_binary(path):
+    with open(path, "rb") as file:
+        buffer = file.read()
+    if len(buffer) < 8:
+        raise ValueError(f"{path} is not a COLMAP points3D.bin file.")
+
+    point_count = int(np.frombuffer(buffer, dtype="<u8", count=1)[0])
+    track_length_offset = 8 + COLMAP_POINT_DTYPE.fields["track_length"][1]
+    unpack_track_length = COLMAP_TRACK_LENGTH_STRUCT.unpack_from
+
+    # Only the track lengths depend on the previous records, the offsets follow from their cumulative sum
+    track_lengths = np.empty(point_count, dtype=np.int64)
+    offset = track_length_offset
+    try:
+        for index in range(point_count):
+            track_length, = unpack_track_length(buffer, offset)
+            track_lengths[index] = track_length
+            offset += COLMAP_POINT_DTYPE.itemsize + track_length * COLMAP_TRACK_ELEMENT_SIZE
+    except struct.error as error:
+        raise ValueError(f"{path} ended after {index} of its {point_count} points.") from error
+
+    offsets = np.arange(point_count, dtype=np.int64) * COLMAP_POINT_DTYPE.itemsize + 8
+    offsets[1:] += np.cumsum(track_lengths[:-1]) * COLMAP_TRACK_ELEMENT_SIZE
+    if point_count > 0 and offsets[-1] + COLMAP_POINT_DTYPE.itemsize > len(buffer):
+        raise ValueError(f"{path} ended after {point_count - 1} of its {point_count} points.")
+
+    # Overlapping view with a record starting at every byte, so the fixed size parts are gathered by their offsets
+    record_view = np.ndarray(shape=(max(len(buffer) - COLMAP_POINT_DTYPE.itemsize + 1, 0),), dtype=COLMAP_POINT_DTYPE,
+                             buffer=buffer, strides=(1,))
+    records = record_view[offsets]
+    return records["xyz"].astype(np.float64), records["rgb"].copy()
@@ -1,15 +1,30 @@
+import json
+import zipfile
+from dataclasses import dataclass
 from datetime import datetime
 from enum import IntEnum, auto
 
+import numpy as np
 import plyfile
 import os.path
 
 import torch
 
-from src.models.gaussian_model import GaussianModel
-from src.utils.point_cloud_converter import convert_input_pc_to_open3d_pc, convert_gs_to_open3d_pc
+from src.models.compact_gaussian_model import CompactGaussianModel, is_compact_file
+from src.models.gaussian_model import GaussianModel, LazyGaussianModel
+from src.utils.colmap_util import is_colmap_points_file, read_colmap_point_count, read_colmap_points
+from src.utils.general_utils import build_scaling_rotation
+from src.utils.graphics_utils import sh2rgb
+from src.utils.ply_util import read_ply_header, iterate_vertex_chunks, PLY_READ_CHUNK_SIZE
+from src.utils.point_cloud_cache import PointCloudCache
+from src.utils.point_cloud_converter import convert_input_pc_to_open3d_pc, convert_gs_to_open3d_pc, \
+    create_open3d_pc, create_gaussian_open3d_pc, NormalEstimationType, NormalOrientationType
+from src.utils.subsampling_util import StreamingSubsampler
 import open3d as o3d
 
+# Converted Open3D point clouds, keyed on the source file and the conversion parameters
+point_cloud_cache = PointCloudCache(os.path.join(os.getcwd(), "cache"))
+
 
 class PointCloudType(IntEnum):
     GAUSSIAN = auto()
@@ -17,17 +32,112 @@ class PointCloudType(IntEnum):
     UNKNOWN = auto()
 
 
-def load_sparse_pc(pc_path):
+# Sparse PLY inputs above this size (in bytes) are streamed chunk by chunk instead of being read entirely
+STREAMING_SIZE_THRESHOLD = 256 * 1024 ** 2
+
+# Properties read by the streaming loader for the registration-ready point clouds
+STREAMED_GAUSSIAN_PROPERTIES = ["x", "y", "z", "f_dc_0", "f_dc_1", "f_dc_2", "opacity",
+                                "scale_0", "scale_1", "scale_2", "rot_0", "rot_1", "rot_2", "rot_3"]
+STREAMED_INPUT_PROPERTIES = ["x", "y", "z", "red", "green", "blue"]
+
+# Directories above the PLY file that are searched for the cameras.json of the training
+# (e.g. <model>/point_cloud/iteration_30000/point_cloud.ply)
+CAMERA_SEARCH_DEPTH = 3
+
+
+@dataclass
+class PointCloudProbe:
+    point_cloud_type: PointCloudType
+    vertex_count: int
+    property_names: list
+    # -1 for non-Gaussian point clouds
+    sh_degree: int = -1
+    is_compact: bool = False
+
+
+def probe_point_cloud(pc_path):
+    """
+    Determines the type, size and properties of a point cloud file by reading only its header.
+    Returns None if the file does not exist or it is neither a PLY nor a compact Gaussian file.
+    """
     if not os.path.isfile(pc_path):
         return None
 
-    point_cloud_plyfile = plyfile.PlyData.read(pc_path)
+    try:
+        if is_colmap_points_file(pc_path):
+            # The text format only stores the point count in an optional comment
+            point_count = read_colmap_point_count(pc_path)
+            return PointCloudProbe(PointCloudType.INPUT, -1 if point_count is None else point_count,
+                                   ["x", "y", "z", "red", "green", "blue"])
+
+        if is_compact_file(pc_path):
+            return probe_compact_file(pc_path)
 
-    pc_type = check_point_cloud_type(point_cloud_plyfile)
-    if pc_type is not PointCloudType.INPUT:
+        header = read_ply_header(pc_path)
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
         return None
 
-    return convert_input_pc_to_open3d_pc(point_cloud_plyfile)
+    pc_type = get_point_cloud_type(header.property_names)
+    sh_degree = -1
+    if pc_type is PointCloudType.GAUSSIAN:
+        sh_degree = GaussianModel.get_sh_degree_from_names(header.property_names)
+
+    return PointCloudProbe(pc_type, header.vertex_count, header.property_names, sh_degree)
+
+
+def probe_compact_file(pc_path):
+    with zipfile.ZipFile(pc_path) as archive:
+        with archive.open("xyz.npy") as file:
+            version = np.lib.format.read_magic(file)
+            if version == (1, 0):
+                shape, _, _ = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, _, _ = np.lib.format.read_array_header_2_0(file)
+
+        with archive.open("sh_degree.npy") as file:
+            sh_degree = int(np.lib.format.read_array(file))
+
+        property_names = [os.path.splitext(name)[0] for name in archive.namelist()]
+
+    return PointCloudProbe(PointCloudType.GAUSSIAN, shape[0], property_names, sh_degree, is_compact=True)
+
+
+def get_subsampling_params(stride=1, voxel_size=0.0, min_opacity=0.0):
+    """Returns the subsampling parameters of a streamed load for the cache key, none if nothing is subsampled."""
+    if stride <= 1 and voxel_size <= 0.0 and min_opacity <= 0.0:
+        return {}
+
+    return {"stride": int(stride), "voxel_size": float(voxel_size), "min_opacity": float(min_opacity)}
+
+
+def load_sparse_pc(pc_path, use_cache=True, streaming_threshold=STREAMING_SIZE_THRESHOLD, stride=1, voxel_size=0.0,
+                   progress_callback=None):
+    """
+    Loads a sparse PLY or COLMAP point cloud. PLY files larger than the streaming threshold (None to never stream)
+    or subsampled by stride or voxel grid are converted by load_streamed_pc, which does not hold the whole file.
+    """
+    probe = probe_point_cloud(pc_path)
+    if probe is None or probe.point_cloud_type is not PointCloudType.INPUT:
+        return None
+
+    if is_colmap_points_file(pc_path):
+        return get_converted_pc(pc_path, probe.point_cloud_type, lambda: convert_colmap_pc(pc_path), use_cache)
+
+    subsampling_params = get_subsampling_params(stride, voxel_size)
+    if subsampling_params or (streaming_threshold is not None and os.path.getsize(pc_path) > streaming_threshold):
+        return get_converted_pc(pc_path, probe.point_cloud_type,
+                                lambda: load_streamed_pc(pc_path, stride, voxel_size,
+                                                         progress_callback=progress_callback),
+                                use_cache, **subsampling_params)
+
+    point_cloud_plyfile = plyfile.PlyData.read(pc_path)
+    return get_converted_pc(pc_path, probe.point_cloud_type, lambda: convert_input_pc_to_open3d_pc(point_cloud_plyfile),
+                            use_cache)
+
+
+def convert_colmap_pc(pc_path):
+    points, colors = read_colmap_points(pc_path)
+    return create_open3d_pc(points, colors / 255)
 
 
 def load_o3d_pc(pc_path):
@@ -38,37 +148,188 @@ def load_o3d_pc(pc_path):
 
 
 def load_plyfile_pc(pc_path):
-    if not os.path.isfile(pc_path):
+    # The whole file is only read if its header describes a Gaussian point cloud
+    probe = probe_point_cloud(pc_path)
+    if probe is None or probe.point_cloud_type is not PointCloudType.GAUSSIAN or probe.is_compact:
         return None
 
-    point_cloud_plyfile = plyfile.PlyData.read(pc_path)
+    return plyfile.PlyData.read(pc_path)
+
 
-    pc_type = check_point_cloud_type(point_cloud_plyfile)
-    if pc_type is not PointCloudType.GAUSSIAN:
+def load_gaussian_model(pc_path, lazy=False, device_name="cpu", spatial_sort=False):
+    """
+    Loads a Gaussian PLY file or a compact Gaussian file directly onto the given device, where the activations and
+    the covariances are computed as well. Returns None if the file is neither.
+    If spatial_sort is set, the splats are sorted along the Z-order curve, which decodes a lazy model entirely.
+    """
+    probe = probe_point_cloud(pc_path)
+    if probe is None or probe.point_cloud_type is not PointCloudType.GAUSSIAN:
         return None
 
-    return point_cloud_plyfile
+    if probe.is_compact:
+        gaussian_point_cloud = CompactGaussianModel.load(pc_path).to_gaussian(device_name)
+    else:
+        plyfile_point_cloud = plyfile.PlyData.read(pc_path)
 
+        # The lazy model only decodes the attributes needed for the conversion, the rest stays in the mapped file
+        model_class = LazyGaussianModel if lazy else GaussianModel
+        gaussian_point_cloud = model_class(device_name=device_name)
+        gaussian_point_cloud.from_ply(plyfile_point_cloud)
 
-def load_gaussian_pc(pc_path):
-    torch.cuda.empty_cache()
-    plyfile_point_cloud = load_plyfile_pc(pc_path)
+    if spatial_sort:
+        gaussian_point_cloud.sort_spatially()
 
-    if not is_point_cloud_gaussian(plyfile_point_cloud):
-        return None, None
+    return gaussian_point_cloud
 
-    gaussian_point_cloud = GaussianModel(device_name="cuda:0")
-    gaussian_point_cloud.from_ply(plyfile_point_cloud)
-    gaussian_point_cloud.move_to_device("cpu")
 
-    o3d_point_cloud = convert_gs_to_open3d_pc(gaussian_point_cloud)
-    torch.cuda.empty_cache()
+def load_gaussian_pc(pc_path, lazy=False, use_cache=True, device_name="cpu", spatial_sort=False,
+                     normal_estimation=NormalEstimationType.Covariance,
+                     normal_orientation=NormalOrientationType.Disabled):
+    gaussian_point_cloud = load_gaussian_model(pc_path, lazy, device_name, spatial_sort)
+
+    if gaussian_point_cloud is None:
+        return None, None
+
+    # The order of the converted points follows the order of the splats
+    viewpoints, orient_to_centroid = get_orientation_targets(pc_path, normal_orientation)
+    o3d_point_cloud = get_converted_pc(pc_path, PointCloudType.GAUSSIAN,
+                                       lambda: convert_gs_to_open3d_pc(gaussian_point_cloud, normal_estimation,
+                                                                       viewpoints, orient_to_centroid),
+                                       use_cache, spatial_sort=spatial_sort, normal_estimation=normal_estimation.name,
+                                       normal_orientation=normal_orientation.name)
     return o3d_point_cloud, gaussian_point_cloud
 
 
+def find_camera_positions(pc_path):
+    """
+    Returns the (M, 3) positions of the training cameras in the cameras.json next to or above the Gaussian PLY file,
+    or None if there is no such file.
+    """
+    directory = os.path.dirname(os.path.abspath(pc_path))
+    for _ in range(CAMERA_SEARCH_DEPTH):
+        cameras_path = os.path.join(directory, "cameras.json")
+        if os.path.isfile(cameras_path):
+            with open(cameras_path) as file:
+                cameras = json.load(file)
+            return np.array([camera["position"] for camera in cameras], dtype=np.float64).reshape(-1, 3)
+
+        directory = os.path.dirname(directory)
+
+    return None
+
+
+def get_orientation_targets(pc_path, normal_orientation):
+    """
+    Returns the viewpoints and the centroid flag of convert_gs_to_open3d_pc for the orientation. The normals are
+    oriented toward the centroid if the training cameras are requested but not found.
+    """
+    if normal_orientation is NormalOrientationType.Disabled:
+        return None, False
+
+    viewpoints = find_camera_positions(pc_path) if normal_orientation is NormalOrientationType.Cameras else None
+    if viewpoints is not None and viewpoints.shape[0] > 0:
+        return viewpoints, False
+
+    return None, True
+
+
+def load_registration_pc(pc_path, use_cache=True, stride=1, voxel_size=0.0, min_opacity=0.0,
+                         normal_estimation=NormalEstimationType.Covariance,
+                         normal_orientation=NormalOrientationType.Disabled, progress_callback=None):
+    """
+    Streams a Gaussian PLY file into a subsampled, registration-ready Open3D point cloud without its Gaussian model.
+    Returns the point cloud and None in place of the model, or None and None if the file is not a Gaussian PLY file.
+    """
+    probe = probe_point_cloud(pc_path)
+    if probe is None or probe.point_cloud_type is not PointCloudType.GAUSSIAN or probe.is_compact:
+        return None, None
+
+    o3d_point_cloud = get_converted_pc(pc_path, PointCloudType.GAUSSIAN,
+                                       lambda: load_streamed_pc(pc_path, stride, voxel_size, min_opacity,
+                                                                normal_estimation=normal_estimation,
+                                                                normal_orientation=normal_orientation,
+                                                                progress_callback=progress_callback),
+                                       use_cache, streamed=True, normal_estimation=normal_estimation.name,
+                                       normal_orientation=normal_orientation.name,
+                                       **get_subsampling_params(stride, voxel_size, min_opacity))
+    return o3d_point_cloud, None
+
+
+def load_streamed_pc(pc_path, stride=1, voxel_size=0.0, min_opacity=0.0, chunk_size=PLY_READ_CHUNK_SIZE,
+                     normal_estimation=NormalEstimationType.Covariance,
+                     normal_orientation=NormalOrientationType.Disabled, progress_callback=None):
+    """
+    Builds a registration-ready Open3D point cloud from a Gaussian or sparse PLY file without loading the whole file.
+    Only the needed properties of a single chunk are held in memory at once, and the points are subsampled by
+    stride, voxel grid and (for Gaussian point clouds) activated opacity while reading. The normals of Gaussian point
+    clouds are estimated and oriented like in load_gaussian_pc. The progress callback gets the bytes read and the total.
+    """
+    probe = probe_point_cloud(pc_path)
+    if probe is None or probe.point_cloud_type is PointCloudType.UNKNOWN or probe.is_compact:
+        return None
+
+    is_gaussian = probe.point_cloud_type is PointCloudType.GAUSSIAN
+    property_names = STREAMED_GAUSSIAN_PROPERTIES if is_gaussian else STREAMED_INPUT_PROPERTIES
+    subsampler = StreamingSubsampler(stride, voxel_size, min_opacity)
+
+    # Only copies of the kept points of every chunk are collected (slices would keep the whole chunks alive), they
+    # are concatenated once at the end
+    point_chunks, color_chunks, covariance_chunks = [], [], []
+    for chunk in iterate_vertex_chunks(pc_path, property_names, chunk_size, progress_callback):
+        if not is_gaussian:
+            chunk = chunk[subsampler.select(chunk[:, :3])]
+            point_chunks.append(chunk[:, :3].copy())
+            color_chunks.append(chunk[:, 3:6] / 255)
+            continue
+
+        opacities = 1 / (1 + np.exp(-chunk[:, 6]))
+        chunk = chunk[subsampler.select(chunk[:, :3], opacities)]
+        point_chunks.append(chunk[:, :3].copy())
+        color_chunks.append(sh2rgb(chunk[:, 3:6]))
+
+        scaling_rotation = build_scaling_rotation(torch.exp(torch.from_numpy(chunk[:, 7:10])),
+                                                  torch.from_numpy(chunk[:, 10:14]))
+        covariance_chunks.append((scaling_rotation @ scaling_rotation.transpose(1, 2)).numpy())
+
+    if sum(points.shape[0] for points in point_chunks) == 0:
+        return None
+
+    if not is_gaussian:
+        return create_open3d_pc(np.concatenate(point_chunks), np.concatenate(color_chunks))
+
+    return create_gaussian_open3d_pc(np.concatenate(point_chunks).astype(np.float64),
+                                     np.concatenate(color_chunks).astype(np.float64),
+                                     torch.from_numpy(np.concatenate(covariance_chunks)), normal_estimation,
+                                     *get_orientation_targets(pc_path, normal_orientation))
+
+
+def get_converted_pc(pc_path, pc_type, convert, use_cache=True, **conversion_params):
+    """
+    Returns the cached conversion of the point cloud if there is one, otherwise converts and caches it.
+    The conversion parameters that change the result are part of the cache key.
+    """
+    if not use_cache:
+        return convert()
+
+    cache_key = point_cloud_cache.get_key(pc_path, point_cloud_type=pc_type.name, **conversion_params)
+    o3d_point_cloud = point_cloud_cache.load(cache_key)
+    if o3d_point_cloud is not None:
+        return o3d_point_cloud
+
+    o3d_point_cloud = convert()
+    try:
+        point_cloud_cache.store(cache_key, o3d_point_cloud)
+    except OSError as e:
+        print(f"Could not cache the converted point cloud: {e}")
+
+    return o3d_point_cloud
+
+
 def check_point_cloud_type(point_cloud):
-    props = [p.name for p in point_cloud['vertex'].properties]
+    return get_point_cloud_type([p.name for p in point_cloud['vertex'].properties])
+
 
+def get_point_cloud_type(props):
     if "red" in props:
         return PointCloudType.INPUT
 
@@ -91,8 +352,8 @@ def save_point_clouds_to_cache(pc_first, pc_second):
 
     working_dir = os.getcwd()
 
-    pc_path_first = os.path.join(working_dir, "cache\\point_cloud_first_" + formatted_time + ".ply")
-    pc_path_second = os.path.join(working_dir, "cache\\point_cloud_second_" + formatted_time + ".ply")
+    pc_path_first = os.path.join(working_dir, "cache", "point_cloud_first_" + formatted_time + ".ply")
+    pc_path_second = os.path.join(working_dir, "cache", "point_cloud_second_" + formatted_time + ".ply")
 
     o3d.io.write_point_cloud(pc_path_first, pc_first)
     o3d.io.write_point_cloud(pc_path_second, pc_second)
@@ -12,6 +12,16 @@
 import numpy as np
 import torch
 
+# Number of splats processed at once by build_symmetric_covariance and transform_splats, which bounds the size of
+# the temporaries
+COVARIANCE_CHUNK_SIZE = 1 << 20
+TRANSFORM_CHUNK_SIZE = 1 << 18
+# The eigensolver creates many temporaries per matrix, smaller chunks keep them in the cache
+EIGEN_CHUNK_SIZE = 1 << 16
+
+# Row and column of the entries of the packed (N, 6) covariances
+PACKED_COVARIANCE_INDICES = ((0, 0), (0, 1), (0, 2), (1, 1), (1, 2), (2, 2))
+
 
 def inverse_sigmoid(x):
     return torch.log(x / (1 - x))
@@ -80,6 +90,166 @@ def build_scaling_rotation(s, r):
     return L
 
 
+def build_symmetric_covariance(s, r, chunk_size=COVARIANCE_CHUNK_SIZE):
+    """
+    Computes the upper triangle of R S S^T R^T in the (N, 6) layout of strip_symmetric, on the device of the inputs.
+    The scaling is applied by broadcasting instead of a diagonal matrix product, and the (N, 3, 3) temporaries are
+    limited to a single chunk.
+    """
+    covariance = torch.empty((s.shape[0], 6), dtype=torch.float, device=s.device)
+    # Indices of the upper triangle in the flattened 3x3 matrices
+    upper_indices = torch.tensor([0, 1, 2, 4, 5, 8], device=s.device)
+
+    for start in range(0, s.shape[0], chunk_size):
+        L = build_rotation(r[start:start + chunk_size]) * s[start:start + chunk_size, None, :]
+        covariance[start:start + chunk_size] = (L @ L.transpose(1, 2)).reshape(-1, 9)[:, upper_indices]
+
+    return covariance
+
+
+def get_covariance_transform(rotation_matrix):
+    """
+    Returns the 6x6 matrix W for which C @ W equals the packed form of R C R^T, for any packed covariance C.
+    The off-diagonal entries appear once in the packed form, so their rows sum both symmetric terms.
+    """
+    R = rotation_matrix.detach().double().cpu()
+    W = torch.zeros((6, 6), dtype=torch.float64)
+    for p, (k, l) in enumerate(PACKED_COVARIANCE_INDICES):
+        for q, (i, j) in enumerate(PACKED_COVARIANCE_INDICES):
+            W[p, q] = R[i, k] * R[j, l]
+            if k != l:
+                W[p, q] += R[i, l] * R[j, k]
+
+    return W.to(dtype=rotation_matrix.dtype, device=rotation_matrix.device)
+
+
+def get_quaternion_product_matrix(quaternion):
+    """Returns the 4x4 matrix Q for which q @ Q is the product of q and the given (w, x, y, z) quaternion."""
+    w, x, y, z = quaternion
+    return torch.stack([torch.stack([w, x, y, z]),
+                        torch.stack([-x, w, z, -y]),
+                        torch.stack([-y, -z, w, x]),
+                        torch.stack([-z, y, -x, w])])
+
+
+def transform_splats(xyz, covariance, rotation, transformation_matrix, out=None, chunk_size=TRANSFORM_CHUNK_SIZE):
+    """
+    Applies the rigid transformation to the positions, packed covariances and rotations of the splats. A fixed
+    rotation acts linearly on both the packed covariances and the quaternions, so every attribute is transformed by a
+    single small matrix product per chunk. The results are written into the (xyz, covariance, rotation) tensors of
+    out, or into the inputs if out is None.
+    """
+    xyz_out, covariance_out, rotation_out = (xyz, covariance, rotation) if out is None else out
+    transformation_matrix = transformation_matrix.to(device=xyz.device, dtype=xyz.dtype)
+    rotation_matrix = transformation_matrix[:3, :3]
+    translation = transformation_matrix[:3, 3]
+    covariance_transform = get_covariance_transform(rotation_matrix)
+    rotation_transform = get_quaternion_product_matrix(matrix_to_quaternion(rotation_matrix))
+
+    for start in range(0, xyz.shape[0], chunk_size):
+        end = start + chunk_size
+        xyz_out[start:end] = torch.addmm(translation, xyz[start:end], rotation_matrix.T)
+        covariance_out[start:end] = covariance[start:end] @ covariance_transform
+        rotations = rotation[start:end] @ rotation_transform
+        rotation_out[start:end] = rotations / torch.norm(rotations, p=2, dim=-1, keepdim=True)
+
+
+def get_eigenvector_of_distinct_eigenvalue(matrices, eigenvalues):
+    # The rows of A - λI span the plane orthogonal to the eigenvector, the largest cross product of two rows is the
+    # most accurate normal of that plane
+    shifted = matrices - eigenvalues[:, None, None] * torch.eye(3, dtype=matrices.dtype, device=matrices.device)
+    crosses = torch.stack((torch.linalg.cross(shifted[:, 0], shifted[:, 1]),
+                           torch.linalg.cross(shifted[:, 0], shifted[:, 2]),
+                           torch.linalg.cross(shifted[:, 1], shifted[:, 2])), dim=1)
+    norms = torch.linalg.vector_norm(crosses, dim=2)
+    best = norms.argmax(dim=1)
+    rows = torch.arange(matrices.shape[0], device=matrices.device)
+    return crosses[rows, best] / norms[rows, best, None]
+
+
+def get_orthogonal_complement(vectors):
+    """Returns two unit vectors that form an orthonormal basis together with the (N, 3) unit vectors."""
+    x, y, z = vectors.unbind(dim=1)
+    zeros = torch.zeros_like(x)
+    # The larger of the x and y components is kept, so the first vector never degenerates
+    use_x = x.abs() > y.abs()
+    first = torch.where(use_x[:, None], torch.stack((-z, zeros, x), dim=1), torch.stack((zeros, z, -y), dim=1))
+    first = first / torch.linalg.vector_norm(first, dim=1, keepdim=True)
+    return first, torch.linalg.cross(vectors, first)
+
+
+def eigh_3x3(matrices, chunk_size=EIGEN_CHUNK_SIZE):
+    """
+    Closed-form eigendecomposition of (N, 3, 3) symmetric matrices, which is considerably faster than
+    torch.linalg.eigh for millions of small matrices. Returns the eigenvalues in ascending order and the eigenvectors
+    as the columns of a rotation matrix (a right-handed basis), like torch.linalg.eigh apart from the handedness.
+    The eigenvalues come from the trigonometric solution of the characteristic polynomial. The eigenvector of the
+    most separated eigenvalue is computed first and the second one is solved for in its orthogonal complement,
+    which keeps repeated eigenvalues stable (D. Eberly, A Robust Eigensolver for 3x3 Symmetric Matrices).
+    """
+    eigenvalues = torch.empty(matrices.shape[:2], dtype=matrices.dtype, device=matrices.device)
+    eigenvectors = torch.empty_like(matrices)
+    for start in range(0, matrices.shape[0], chunk_size):
+        end = start + chunk_size
+        eigenvalues[start:end], eigenvectors[start:end] = _eigh_3x3(matrices[start:end])
+
+    return eigenvalues, eigenvectors
+
+
+def _eigh_3x3(matrices):
+    dtype = matrices.dtype
+    matrices = matrices.double()
+    eye = torch.eye(3, dtype=matrices.dtype, device=matrices.device)
+
+    # Scaling by the largest entry avoids overflows, zero matrices are left as they are
+    scale = matrices.abs().amax(dim=(1, 2)).clamp(min=torch.finfo(matrices.dtype).tiny)
+    matrices = matrices / scale[:, None, None]
+
+    a00, a11, a22 = matrices.diagonal(dim1=1, dim2=2).unbind(dim=1)
+    a01, a02, a12 = matrices[:, 0, 1], matrices[:, 0, 2], matrices[:, 1, 2]
+    q = (a00 + a11 + a22) / 3
+    b00, b11, b22 = a00 - q, a11 - q, a22 - q
+    p = torch.sqrt((b00 * b00 + b11 * b11 + b22 * b22 + 2 * (a01 * a01 + a02 * a02 + a12 * a12)) / 6)
+    # det(B) / 2 with B = (A - qI) / p, B is set to zero for multiples of the identity
+    shifted_det = b00 * (b11 * b22 - a12 * a12) - a01 * (a01 * b22 - a12 * a02) + a02 * (a01 * a12 - b11 * a02)
+    half_det = (shifted_det / (2 * p.clamp(min=1e-100) ** 3)).clamp(-1, 1)
+    half_det = torch.where(p > 0, half_det, torch.zeros_like(half_det))
+    angle = torch.acos(half_det) / 3
+    largest = q + 2 * p * torch.cos(angle)
+    smallest = q + 2 * p * torch.cos(angle + 2 * np.pi / 3)
+    middle = 3 * q - largest - smallest
+    eigenvalues = torch.stack((smallest, middle, largest), dim=1)
+
+    # The largest eigenvalue is the most separated one if det(B) >= 0, otherwise the smallest one is
+    largest_first = half_det >= 0
+    distinct = torch.where(largest_first, largest, smallest)
+    distinct_vector = get_eigenvector_of_distinct_eigenvalue(matrices, distinct)
+    # Multiples of the identity have no distinct eigenvalue, any basis is an eigenbasis
+    distinct_vector = torch.where((p > 0)[:, None], distinct_vector, eye[0].expand_as(distinct_vector))
+
+    # The middle eigenvector minimizes the 2x2 restriction of A - λI to the orthogonal complement
+    u, v = get_orthogonal_complement(distinct_vector)
+    au = torch.bmm(matrices, u[:, :, None]).squeeze(2)
+    av = torch.bmm(matrices, v[:, :, None]).squeeze(2)
+    m00 = (u * au).sum(dim=1) - middle
+    m01 = (u * av).sum(dim=1)
+    m11 = (v * av).sum(dim=1) - middle
+    use_first_row = m00.abs() >= m11.abs()
+    a = torch.where(use_first_row, m00, m01)
+    b = torch.where(use_first_row, m01, m11)
+    length = torch.sqrt(a * a + b * b)
+    middle_vector = (b / length.clamp(min=1e-300))[:, None] * u - (a / length.clamp(min=1e-300))[:, None] * v
+    middle_vector = torch.where((length > 0)[:, None], middle_vector, u)
+
+    other_vector = torch.linalg.cross(distinct_vector, middle_vector)
+    smallest_vector = torch.where(largest_first[:, None], other_vector, distinct_vector)
+    # The last column completes a right-handed basis
+    eigenvectors = torch.stack((smallest_vector, middle_vector,
+                                torch.linalg.cross(smallest_vector, middle_vector)), dim=2)
+
+    return (eigenvalues * scale[:, None]).to(dtype), eigenvectors.to(dtype)
+
+
 def convert_to_camera_transform(rot, pos):
     W2C = np.zeros((4, 4))
     W2C[:3, 3] = pos
@@ -14,11 +14,13 @@ import math
 import numpy as np
 import torch
 
+from src.utils.general_utils import eigh_3x3
+
 
 def get_normals_from_covariance(covariance_mat):
-    eigen_values, eigen_vectors = torch.linalg.eig(covariance_mat)
-    min_eigenvalue_index = eigen_values.argsort()[:, 0]
-    return eigen_vectors[torch.arange(eigen_values.shape[0]), :, min_eigenvalue_index]
+    # The eigenvalues are sorted, the normal is the axis of the smallest extent
+    _, eigen_vectors = eigh_3x3(covariance_mat)
+    return eigen_vectors[:, :, 0]
 
 
 def getWorld2View2(R, t, translate=np.array([.0, .0, .0]), scale=1.0):
@@ -1,5 +1,6 @@
 from enum import Enum
 
+import numpy as np
 import open3d as o3d
 
 
@@ -36,6 +37,20 @@ class LocalRegistrationType(Enum):
     ICP_General = "Generalized ICP"
 
 
+class LocalRegistrationBackend(Enum):
+    def __new__(cls, *args, **kwds):
+        value = len(cls.__members__)
+        obj = object.__new__(cls)
+        obj._value_ = value
+        return obj
+
+    def __init__(self, name):
+        self.instance_name = name
+
+    Legacy = "Open3D legacy"
+    Tensor = "Open3D tensor (multi-scale)"
+
+
 def get_estimation(registration_type, loss_function):
     if loss_function is None:
         return o3d.pipelines.registration.TransformationEstimationPointToPoint()
@@ -98,3 +113,105 @@ def do_icp_registration(point_cloud_first, point_cloud_second, init_transform,
                                                                            estimation_method, convergence_criteria)
         case _:
             return None
+
+
+def uses_tensor_backend(registration_params):
+    # The tensor pipeline of Open3D has no generalized ICP, it is always run by the legacy one
+    return (registration_params.backend is LocalRegistrationBackend.Tensor and
+            registration_params.registration_type is not LocalRegistrationType.ICP_General)
+
+
+def requires_normals(registration_type):
+    return registration_type is not LocalRegistrationType.ICP_Point_To_Point
+
+
+def get_tensor_rejection_kernel(rejection_type, k_value):
+    robust_kernel = o3d.t.pipelines.registration.robust_kernel
+    if rejection_type is KernelLossFunctionType.Loss_None or k_value == 0.0:
+        return robust_kernel.RobustKernel(robust_kernel.RobustKernelMethod.L2Loss)
+
+    match rejection_type:
+        case KernelLossFunctionType.Tukey_Loss:
+            return robust_kernel.RobustKernel(robust_kernel.RobustKernelMethod.TukeyLoss, k_value)
+        case KernelLossFunctionType.Cauchy_Loss:
+            return robust_kernel.RobustKernel(robust_kernel.RobustKernelMethod.CauchyLoss, k_value)
+        case KernelLossFunctionType.GMLoss:
+            return robust_kernel.RobustKernel(robust_kernel.RobustKernelMethod.GMLoss, k_value)
+        case KernelLossFunctionType.Huber_Loss:
+            return robust_kernel.RobustKernel(robust_kernel.RobustKernelMethod.HuberLoss, k_value)
+
+
+def get_tensor_estimation(registration_type, kernel):
+    match registration_type:
+        case LocalRegistrationType.ICP_Point_To_Plane:
+            return o3d.t.pipelines.registration.TransformationEstimationPointToPlane(kernel)
+        case LocalRegistrationType.ICP_Color:
+            return o3d.t.pipelines.registration.TransformationEstimationForColoredICP(kernel)
+        case _:
+            return o3d.t.pipelines.registration.TransformationEstimationPointToPoint()
+
+
+def get_scales(max_correspondence, scale_count):
+    """
+    Returns the voxel sizes and max correspondence distances of the scales, from the coarsest to the finest one.
+    Every coarser scale doubles the correspondence distance and is downsampled to half of it, the finest scale uses
+    the whole point clouds.
+    """
+    scale_count = max(scale_count, 1)
+    max_correspondences = [max_correspondence * 2 ** level for level in reversed(range(scale_count))]
+    voxel_sizes = [distance / 2 for distance in max_correspondences[:-1]] + [-1.0]
+    return voxel_sizes, max_correspondences
+
+
+def get_registration_point_cloud(point_cloud):
+    """
+    Returns a tensor point cloud sharing the attributes used by the registration. The other ones are left out, as the
+    voxel downsampling of the multi-scale ICP can only average (N, 3) attributes (e.g. not the covariances).
+    """
+    registration_point_cloud = o3d.t.geometry.PointCloud(point_cloud.device)
+    for name in ("positions", "colors", "normals"):
+        if name in point_cloud.point:
+            registration_point_cloud.point[name] = point_cloud.point[name]
+
+    return registration_point_cloud
+
+
+def do_tensor_icp_registration(point_cloud_first, point_cloud_second, init_transform, registration_params,
+                               iteration_callback=None):
+    """
+    Registers the float32 tensor point clouds with the multi-scale ICP of the tensor pipeline of Open3D. The
+    callback receives the attributes of every iteration (iteration_index, scale_index, fitness, inlier_rmse, ...).
+    Returns a legacy registration result, so the results of both backends are handled the same way.
+    """
+    kernel = get_tensor_rejection_kernel(registration_params.rejection_type, registration_params.k_value)
+    estimation_method = get_tensor_estimation(registration_params.registration_type, kernel)
+    voxel_sizes, max_correspondences = get_scales(registration_params.max_correspondence,
+                                                  registration_params.scale_count)
+    criteria_list = [o3d.t.pipelines.registration.ICPConvergenceCriteria(registration_params.relative_fitness,
+                                                                         registration_params.relative_rmse,
+                                                                         registration_params.max_iteration)
+                     for _ in voxel_sizes]
+
+    init_transform = o3d.core.Tensor(np.asarray(init_transform, dtype=np.float64))
+    tensor_result = o3d.t.pipelines.registration.multi_scale_icp(get_registration_point_cloud(point_cloud_first),
+                                                                 get_registration_point_cloud(point_cloud_second),
+                                                                 o3d.utility.DoubleVector(voxel_sizes),
+                                                                 criteria_list,
+                                                                 o3d.utility.DoubleVector(max_correspondences),
+                                                                 init_transform, estimation_method,
+                                                                 iteration_callback)
+
+    result = o3d.pipelines.registration.RegistrationResult()
+    result.transformation = tensor_result.transformation.cpu().numpy()
+    result.fitness = tensor_result.fitness
+    result.inlier_rmse = tensor_result.inlier_rmse
+    # Unlike the legacy pipeline, the correspondences are stored for every source point, -1 marking the missing ones
+    correspondences = getattr(tensor_result, "correspondence_set", None)
+    if correspondences is None:
+        # Older versions of Open3D name the attribute correspondences_
+        correspondences = tensor_result.correspondences_
+    correspondences = correspondences.cpu().numpy().reshape(-1)
+    source_indices = np.flatnonzero(correspondences != -1)
+    result.correspondence_set = o3d.utility.Vector2iVector(
+        np.column_stack((source_indices, correspondences[source_indices])).astype(np.int32))
+    return result
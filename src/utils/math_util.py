@@ -1,58 +1,88 @@
+import functools
+
 import numpy as np
-from e3nn import o3
 import torch
 
 
-# Not sure if this is actually needed.
-def rotate_sh(pc, points, transformation_matrix):
-    vertex_data = pc["vertex"].data
-
-    # Read in the SH
-    extra_f_names = [p.name for p in pc["vertex"].properties if p.name.startswith("f_rest_")]
-    extra_f_names = sorted(extra_f_names, key=lambda x: int(x.split('_')[-1]))
-    features_extra = np.zeros((points.shape[0], len(extra_f_names)))
-    for idx, attr_name in enumerate(extra_f_names):
-        features_extra[:, idx] = np.asarray(pc.elements[0][attr_name])
-    # Reshape (P,F*SH_coeffs) to (P, F, SH_coeffs except DC)
-    features_extra = features_extra.reshape((features_extra.shape[0], 3, 4 ** 2 - 1))
-
-    # Calculate second and third order and multiply them by the rotation
-    d_1 = transformation_matrix
-    d_2 = get_wigner_from_rotation(2, transformation_matrix)
-    d_3 = get_wigner_from_rotation(3, transformation_matrix)
-
-    # Select the corresponding parts of the spherical harmonics matrix for each order
-    spherical_harmonics_order1 = features_extra[:, :, :3]  # For J = 1
-    spherical_harmonics_order2 = features_extra[:, :, 3:8]  # For J = 2
-    spherical_harmonics_order3 = features_extra[:, :, 8:]  # For J = 3
-
-    # Multiply each part with the corresponding Wigner D matrix
-    rotated_harmonics_order1 = np.einsum('nij,jk->nik', spherical_harmonics_order1, d_1)
-    rotated_harmonics_order2 = np.einsum('nij,jk->nik', spherical_harmonics_order2, d_2)
-    rotated_harmonics_order3 = np.einsum('nij,jk->nik', spherical_harmonics_order3, d_3)
-
-    features_extra = np.concatenate((rotated_harmonics_order1,
-                                     rotated_harmonics_order2,
-                                     rotated_harmonics_order3), axis=2)
-
-    features_transposed = np.transpose(features_extra, (0, 2, 1))
-    features_flattened = features_transposed.reshape(features_transposed.shape[0], -1)
-
-    for idx, attr_name in enumerate(extra_f_names):
-        vertex_data[attr_name] = features_flattened[:, idx]
-
-
-def get_wigner_from_rotation(order, rotation_matrix):
-    # Convert the rotation_matrix to a tensor
-    rotation_matrix_tensor = torch.tensor(rotation_matrix, dtype=torch.float64)
-
-    # Calculate the rotation angles using the tensor
-    rot_angles = o3._rotation.matrix_to_angles(rotation_matrix_tensor)
-
-    # Calculate the Wigner D matrix using the appropriate function
-    wigner_d = o3.wigner_D(order, rot_angles[0], rot_angles[1], rot_angles[2])
-
-    return wigner_d.numpy()
+# Real spherical harmonics constants of the 3DGS renderer
+SH_C1 = 0.4886025119029199
+SH_C2 = [1.0925484305920792, -1.0925484305920792, 0.31539156525252005, -1.0925484305920792, 0.5462742152960396]
+SH_C3 = [-0.5900435899266435, 2.890611442640554, -0.4570457994644658, 0.3731763325901154, -0.4570457994644658,
+         1.445305721320277, -0.5900435899266435]
+
+# Number of splats rotated at once by rotate_sh
+SH_ROTATION_CHUNK_SIZE = 1 << 18
+# Directions the SH bands are sampled at, when fitting the rotation matrices of the bands
+SH_SAMPLE_DIRECTION_COUNT = 64
+
+
+def eval_sh_basis(directions):
+    """Evaluates the bands 1-3 of the SH basis of the renderer at the unit directions, as (M, 15) values."""
+    x, y, z = directions[:, 0], directions[:, 1], directions[:, 2]
+    xx, yy, zz = x * x, y * y, z * z
+    return np.stack([
+        -SH_C1 * y, SH_C1 * z, -SH_C1 * x,
+        SH_C2[0] * x * y, SH_C2[1] * y * z, SH_C2[2] * (2 * zz - xx - yy), SH_C2[3] * x * z, SH_C2[4] * (xx - yy),
+        SH_C3[0] * y * (3 * xx - yy), SH_C3[1] * x * y * z, SH_C3[2] * y * (4 * zz - xx - yy),
+        SH_C3[3] * z * (2 * zz - 3 * xx - 3 * yy), SH_C3[4] * x * (4 * zz - xx - yy), SH_C3[5] * z * (xx - yy),
+        SH_C3[6] * x * (xx - 3 * yy)], axis=1)
+
+
+def get_sample_directions(count=SH_SAMPLE_DIRECTION_COUNT):
+    # Fibonacci sphere, which covers the sphere evenly and is deterministic
+    indices = np.arange(count) + 0.5
+    polar = np.arccos(1 - 2 * indices / count)
+    azimuth = np.pi * (1 + 5 ** 0.5) * indices
+    return np.stack([np.cos(azimuth) * np.sin(polar), np.sin(azimuth) * np.sin(polar), np.cos(polar)], axis=1)
+
+
+@functools.lru_cache(maxsize=16)
+def _get_sh_rotation_matrix(rotation_key, sh_degree):
+    rotation_matrix = np.array(rotation_key).reshape(3, 3)
+    directions = get_sample_directions()
+    # The rotated color at d equals the original color at R^T d. Every band is closed under rotations, so the
+    # rotation of the coefficients of a band is the least squares fit between the sampled basis values.
+    basis = eval_sh_basis(directions)
+    rotated_basis = eval_sh_basis(directions @ rotation_matrix)
+
+    coefficient_count = (sh_degree + 1) ** 2 - 1
+    sh_rotation = np.zeros((coefficient_count, coefficient_count))
+    for degree in range(1, sh_degree + 1):
+        band = slice(degree ** 2 - 1, (degree + 1) ** 2 - 1)
+        sh_rotation[band, band] = np.linalg.lstsq(basis[:, band], rotated_basis[:, band], rcond=None)[0]
+
+    return sh_rotation
+
+
+def get_sh_rotation_matrix(rotation_matrix, sh_degree):
+    """
+    Returns the block diagonal (K, K) matrix S that rotates the SH coefficients (K = (sh_degree + 1)^2 - 1,
+    without the DC term) of the renderer by the 3x3 rotation matrix: rotated = S @ coefficients.
+    The matrices are cached by rotation, so repeated merges and exports with the same transformation reuse them.
+    """
+    if sh_degree > 3:
+        raise ValueError(f"SH rotation is only supported up to degree 3, got {sh_degree}.")
+
+    if isinstance(rotation_matrix, torch.Tensor):
+        rotation_matrix = rotation_matrix.detach().cpu().numpy()
+
+    rotation_key = tuple(np.asarray(rotation_matrix, dtype=np.float64).flatten().tolist())
+    return _get_sh_rotation_matrix(rotation_key, sh_degree).copy()
+
+
+def rotate_sh(features_rest, rotation_matrix, sh_degree, out=None, chunk_size=SH_ROTATION_CHUNK_SIZE):
+    """
+    Rotates the (N, K, 3) higher order SH coefficients of the splats by the 3x3 rotation matrix, chunk by chunk.
+    The result is written into out, or into features_rest if out is None.
+    """
+    out = features_rest if out is None else out
+    if sh_degree < 1:
+        return
+
+    sh_rotation = torch.from_numpy(get_sh_rotation_matrix(rotation_matrix, sh_degree)).to(
+        device=features_rest.device, dtype=features_rest.dtype)
+    for start in range(0, features_rest.shape[0], chunk_size):
+        out[start:start + chunk_size] = torch.matmul(sh_rotation, features_rest[start:start + chunk_size])
 
 
 def look_at(eye, lookat, up, zoom):
@@ -2,11 +2,14 @@ import open3d as o3d
 import numpy as np
 import torch
 
+from src.utils.point_cloud_converter import to_torch_tensor
 
-def fit_planes(point_cloud: o3d.geometry.PointCloud, plane_count, iterations, threshold, normal_threshold,
+
+def fit_planes(point_cloud: o3d.t.geometry.PointCloud, plane_count, iterations, threshold, normal_threshold,
                min_sample_distance):
-    points_tensor = torch.from_numpy(np.array(point_cloud.points, dtype=np.float32))
-    normal_tensor = torch.from_numpy(np.array(point_cloud.normals, dtype=np.float32))
+    # The float32 attributes of the tensor point cloud are used without a copy
+    points_tensor = to_torch_tensor(point_cloud.point.positions).cpu()
+    normal_tensor = to_torch_tensor(point_cloud.point.normals).cpu()
     original_indices = torch.arange(points_tensor.shape[0])  # Track original indices
     plane_coefficients = []
     inlier_indices_list = []
@@ -0,0 +1,180 @@
+"""
+Low level helpers for reading and writing the binary vertex block of PLY files
+"""
+
+import itertools
+import os
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.lib import recfunctions
+
+PLY_PROPERTY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8",
+}
+
+PLY_BYTE_ORDERS = {"binary_little_endian": "<", "binary_big_endian": ">", "ascii": "="}
+
+# Number of vertices read at once when streaming a PLY file
+PLY_READ_CHUNK_SIZE = 1 << 18
+
+
+@dataclass
+class PlyHeader:
+    ply_format: str
+    vertex_count: int
+    property_names: list
+    # Structured dtype of a single vertex record, in the byte order of the file
+    vertex_dtype: np.dtype
+    # Byte offset of the first vertex record
+    data_offset: int
+
+    @property
+    def is_binary(self):
+        return self.ply_format != "ascii"
+
+    @property
+    def data_size(self):
+        return self.vertex_count * self.vertex_dtype.itemsize
+
+
+def read_ply_header(path):
+    """
+    Parses only the header of the PLY file. Raises ValueError if the file is not a PLY file, it has no vertex
+    element or the vertex records can not be located without parsing the data (e.g. list properties).
+    """
+    with open(path, "rb") as file:
+        if file.readline().strip() != b"ply":
+            raise ValueError(f"{path} is not a PLY file.")
+
+        ply_format = None
+        elements = []
+        while True:
+            line = file.readline()
+            if not line:
+                raise ValueError(f"The header of {path} is not terminated.")
+
+            tokens = line.decode("ascii", errors="replace").split()
+            if not tokens or tokens[0] in ("comment", "obj_info"):
+                continue
+
+            match tokens[0]:
+                case "format":
+                    ply_format = tokens[1]
+                case "element":
+                    elements.append((tokens[1], int(tokens[2]), []))
+                case "property":
+                    if not elements:
+                        raise ValueError(f"The header of {path} has a property without an element.")
+                    elements[-1][2].append(tokens[1:])
+                case "end_header":
+                    break
+
+        data_offset = file.tell()
+
+    if ply_format not in PLY_BYTE_ORDERS:
+        raise ValueError(f"Unknown PLY format in {path}: {ply_format}")
+
+    byte_order = PLY_BYTE_ORDERS[ply_format]
+    for name, count, properties in elements:
+        if any(prop[0] == "list" for prop in properties):
+            raise ValueError(f"The {name} element of {path} has list properties.")
+
+        dtype = np.dtype([(prop[1], byte_order + PLY_PROPERTY_TYPES[prop[0]]) for prop in properties])
+        if name == "vertex":
+            return PlyHeader(ply_format, count, [prop[1] for prop in properties], dtype, data_offset)
+
+        if ply_format == "ascii":
+            raise ValueError(f"The vertex element of {path} is not the first element.")
+        data_offset += count * dtype.itemsize
+
+    raise ValueError(f"{path} has no vertex element.")
+
+
+def iterate_vertex_chunks(path, property_names=None, chunk_size=PLY_READ_CHUNK_SIZE, progress_callback=None):
+    """
+    Streams the vertices of the PLY file in chunks of at most chunk_size vertices.
+    Yields (n, len(property_names)) float32 arrays containing only the requested properties, so no more than a
+    single chunk of the file is held in memory. The progress callback receives the number of bytes read so far and
+    the size of the vertex block.
+    """
+    header = read_ply_header(path)
+    property_names = property_names or header.property_names
+    column_indices = [header.property_names.index(name) for name in property_names]
+    native_dtype = header.vertex_dtype.newbyteorder("=")
+    total_size = header.data_size if header.is_binary else os.path.getsize(path) - header.data_offset
+
+    with open(path, "rb") as file:
+        file.seek(header.data_offset)
+        for start in range(0, header.vertex_count, chunk_size):
+            count = min(chunk_size, header.vertex_count - start)
+            if header.is_binary:
+                records = np.fromfile(file, dtype=header.vertex_dtype, count=count)
+                block, _ = get_vertex_block(records.astype(native_dtype, copy=False))
+            else:
+                lines = [line.decode("ascii") for line in itertools.islice(file, count)]
+                block = np.loadtxt(lines, dtype=np.float32, ndmin=2).reshape(len(lines), -1)
+
+            if block.shape[0] != count:
+                raise ValueError(f"{path} ended after {start + block.shape[0]} of {header.vertex_count} vertices.")
+
+            if progress_callback is not None:
+                progress_callback(file.tell() - header.data_offset, total_size)
+
+            yield get_columns(block, column_indices)
+
+
+def get_vertex_block(vertex_data):
+    """
+    Returns the vertex records as a single (N, P) float32 array and the list of property names.
+    If every property is a native float32 (the default for 3DGS outputs), the result is a view
+    of the (possibly memory-mapped) structured array, otherwise the records are converted once.
+    """
+    names = list(vertex_data.dtype.names)
+    field_types = {vertex_data.dtype.fields[name][0] for name in names}
+
+    if field_types == {np.dtype(np.float32)} and vertex_data.dtype.itemsize == 4 * len(names):
+        block = vertex_data.view(np.float32).reshape(vertex_data.shape[0], len(names))
+    else:
+        block = recfunctions.structured_to_unstructured(vertex_data, dtype=np.float32)
+
+    return block, names
+
+
+def get_property_indices(names, prefix):
+    """Returns the column indices of the properties with the given prefix, sorted by their numeric suffix."""
+    indices = [idx for idx, name in enumerate(names) if name.startswith(prefix)]
+    return sorted(indices, key=lambda idx: int(names[idx].split('_')[-1]))
+
+
+def is_contiguous_range(indices):
+    return len(indices) > 0 and indices == list(range(indices[0], indices[0] + len(indices)))
+
+
+def get_columns(block, indices):
+    """Selects the given columns of the block. Consecutive columns are returned as a strided view."""
+    if is_contiguous_range(indices):
+        return block[:, indices[0]:indices[0] + len(indices)]
+
+    return block[:, indices]
+
+
+def get_ply_header(vertex_count, property_names):
+    lines = ["ply", "format binary_little_endian 1.0", f"element vertex {vertex_count}"]
+    lines.extend(f"property float {name}" for name in property_names)
+    lines.append("end_header")
+    return ("\n".join(lines) + "\n").encode("ascii")
+
+
+def write_vertex_blocks(path, vertex_count, property_names, blocks):
+    """
+    Writes a binary little endian PLY file with a single float32 vertex element.
+    The vertex records are streamed to the file from the given iterable of (n, P) arrays.
+    """
+    with open(path, "wb") as file:
+        file.write(get_ply_header(vertex_count, property_names))
+        for block in blocks:
+            np.ascontiguousarray(block, dtype="<f4").tofile(file)
@@ -0,0 +1,150 @@
+"""
+Content-addressed on-disk cache for the converted Open3D point clouds
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import open3d as o3d
+
+# Increase when the stored layout or the conversion itself changes, so stale entries are not reused
+CACHE_FORMAT_VERSION = 1
+CACHE_FILE_EXTENSION = ".npz"
+
+# Size and number of the file regions hashed to fingerprint the source file
+FINGERPRINT_SAMPLE_SIZE = 1 << 20
+FINGERPRINT_SAMPLE_COUNT = 8
+
+
+def get_file_fingerprint(path):
+    """
+    Hashes the size and the whole content of small files. Large files are fingerprinted by evenly spaced regions,
+    which is cheap even for multi-gigabyte scenes, and their modification time, which catches the edits that keep the
+    size of the file and fall between the regions (e.g. retrained opacities).
+    """
+    file_stat = os.stat(path)
+    file_size = file_stat.st_size
+    file_hash = hashlib.blake2b(str(file_size).encode("ascii"), digest_size=20)
+
+    with open(path, "rb") as file:
+        if file_size <= FINGERPRINT_SAMPLE_SIZE * FINGERPRINT_SAMPLE_COUNT:
+            file_hash.update(file.read())
+            return file_hash.hexdigest()
+
+        file_hash.update(str(file_stat.st_mtime_ns).encode("ascii"))
+        step = (file_size - FINGERPRINT_SAMPLE_SIZE) // (FINGERPRINT_SAMPLE_COUNT - 1)
+        for index in range(FINGERPRINT_SAMPLE_COUNT):
+            file.seek(index * step)
+            file_hash.update(file.read(FINGERPRINT_SAMPLE_SIZE))
+
+    return file_hash.hexdigest()
+
+
+def get_point_cloud_arrays(point_cloud):
+    """Returns the points and the existing colors, normals and covariances of the Open3D point cloud."""
+    arrays = {"points": np.asarray(point_cloud.points)}
+    if point_cloud.has_colors():
+        arrays["colors"] = np.asarray(point_cloud.colors)
+    if point_cloud.has_normals():
+        arrays["normals"] = np.asarray(point_cloud.normals)
+    if point_cloud.has_covariances():
+        arrays["covariances"] = np.asarray(point_cloud.covariances)
+
+    return arrays
+
+
+def create_point_cloud_from_arrays(arrays):
+    point_cloud = o3d.geometry.PointCloud()
+    point_cloud.points = o3d.utility.Vector3dVector(arrays["points"])
+    if "colors" in arrays:
+        point_cloud.colors = o3d.utility.Vector3dVector(arrays["colors"])
+    if "normals" in arrays:
+        point_cloud.normals = o3d.utility.Vector3dVector(arrays["normals"])
+    if "covariances" in arrays:
+        point_cloud.covariances = o3d.utility.Matrix3dVector(arrays["covariances"])
+
+    return point_cloud
+
+
+class PointCloudCache:
+    """
+    Stores the points, colors, normals and covariances of converted point clouds as uncompressed numpy archives.
+    The entries are keyed on the fingerprint of the source file and the conversion parameters.
+    The total size of the entries is kept under the size budget by evicting the least recently used ones.
+    """
+
+    def __init__(self, cache_directory, size_budget=4 * 1024 ** 3):
+        self.cache_directory = cache_directory
+        self.size_budget = size_budget
+
+    def get_key(self, source_path, **conversion_params):
+        key_data = json.dumps({"version": CACHE_FORMAT_VERSION,
+                               "fingerprint": get_file_fingerprint(source_path),
+                               "params": conversion_params}, sort_keys=True, default=str)
+        return hashlib.blake2b(key_data.encode("utf-8"), digest_size=20).hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.cache_directory, key + CACHE_FILE_EXTENSION)
+
+    def load(self, key):
+        path = self.get_path(key)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            with np.load(path) as arrays:
+                point_cloud = create_point_cloud_from_arrays(arrays)
+        except (OSError, ValueError, KeyError):
+            # Corrupted or partially written entry
+            self.remove(key)
+            return None
+
+        # The modification time marks the last use for the LRU eviction
+        os.utime(path)
+        return point_cloud
+
+    def store(self, key, point_cloud):
+        arrays = get_point_cloud_arrays(point_cloud)
+        os.makedirs(self.cache_directory, exist_ok=True)
+        path = self.get_path(key)
+        # Unique per store, the point clouds may be loaded and stored from several threads at once
+        file_descriptor, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_directory)
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                np.savez(file, **arrays)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        self.evict()
+
+    def remove(self, key):
+        try:
+            os.remove(self.get_path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_directory):
+            if entry.is_file() and entry.name.endswith(CACHE_FILE_EXTENSION):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.size_budget:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
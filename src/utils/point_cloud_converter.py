@@ -2,11 +2,51 @@
 Converts PLYFILE Point Clouds to the Open3D format
 """
 
+from enum import Enum
+
 import numpy as np
 import open3d as o3d
+import torch
 
+from src.utils.general_utils import eigh_3x3
 from src.utils.graphics_utils import sh2rgb
 
+# Splats whose shortest axis is longer than this fraction of the middle one have their normals estimated from their
+# nearest neighbors instead
+ISOTROPY_THRESHOLD = 0.5
+# Same as the default of estimate_normals
+KNN_NORMAL_NEIGHBOR_COUNT = 30
+KNN_NORMAL_CHUNK_SIZE = 1 << 16
+
+
+class NormalEstimationType(Enum):
+    def __new__(cls, *args, **kwds):
+        value = len(cls.__members__)
+        obj = object.__new__(cls)
+        obj._value_ = value
+        return obj
+
+    def __init__(self, name):
+        self.instance_name = name
+
+    Covariance = "Splat covariance"
+    KNN = "Nearest neighbors"
+
+
+class NormalOrientationType(Enum):
+    def __new__(cls, *args, **kwds):
+        value = len(cls.__members__)
+        obj = object.__new__(cls)
+        obj._value_ = value
+        return obj
+
+    def __init__(self, name):
+        self.instance_name = name
+
+    Disabled = "None"
+    Centroid = "Toward the centroid"
+    Cameras = "Toward the training cameras"
+
 
 def convert_input_pc_to_open3d_pc(pc):
     o3d_pc = o3d.geometry.PointCloud()
@@ -28,22 +68,188 @@ def convert_input_pc_to_open3d_pc(pc):
     return o3d_pc
 
 
-def convert_gs_to_open3d_pc(gaussian):
+def create_open3d_pc(points, colors, covariances=None):
     o3d_pc = o3d.geometry.PointCloud()
-    points = gaussian.get_xyz.double().detach().cpu().numpy()
+    o3d_pc.points = o3d.utility.Vector3dVector(np.asarray(points, dtype=np.float64))
+    o3d_pc.colors = o3d.utility.Vector3dVector(np.asarray(colors, dtype=np.float64))
+    if covariances is not None:
+        o3d_pc.covariances = o3d.utility.Matrix3dVector(np.asarray(covariances, dtype=np.float64))
 
-    o3d_pc.points = o3d.utility.Vector3dVector(points)
+    o3d_pc.estimate_normals()
+    return o3d_pc
 
+
+def get_covariance_normals(covariances, isotropy_threshold=ISOTROPY_THRESHOLD):
+    """
+    Returns the shortest principal axis of the (N, 3, 3) covariances and the mask of the near-isotropic splats, whose
+    two shortest axes are too similar (the ratio of their lengths is above the threshold) to define a normal.
+    """
+    eigenvalues, eigenvectors = eigh_3x3(covariances)
+    eigenvalues = eigenvalues.clamp(min=0)
+    axis_ratios = torch.sqrt(eigenvalues[:, 0] / eigenvalues[:, 1].clamp(min=torch.finfo(eigenvalues.dtype).tiny))
+    return eigenvectors[:, :, 0], axis_ratios > isotropy_threshold
+
+
+def estimate_knn_normals(points, query_indices, neighbor_count=KNN_NORMAL_NEIGHBOR_COUNT,
+                         chunk_size=KNN_NORMAL_CHUNK_SIZE):
+    """
+    Estimates the normals of the queried points from their nearest neighbors among all the points, like
+    estimate_normals of Open3D, but only for the queried subset.
+    """
+    neighbor_search = o3d.core.nns.NearestNeighborSearch(o3d.core.Tensor(points))
+    neighbor_search.knn_index()
+    neighbor_count = min(neighbor_count, points.shape[0])
+
+    normals = np.empty((len(query_indices), 3))
+    for start in range(0, len(query_indices), chunk_size):
+        queries = points[query_indices[start:start + chunk_size]]
+        neighbor_indices, _ = neighbor_search.knn_search(o3d.core.Tensor(queries), neighbor_count)
+        neighbors = torch.from_numpy(points[neighbor_indices.numpy()])
+        centered = neighbors - neighbors.mean(dim=1, keepdim=True)
+        _, eigenvectors = eigh_3x3(centered.transpose(1, 2) @ centered)
+        normals[start:start + chunk_size] = eigenvectors[:, :, 0].numpy()
+
+    return normals
+
+
+def get_splat_normals(points, covariances, isotropy_threshold=ISOTROPY_THRESHOLD):
+    """
+    Returns the shortest axes of the splats as (N, 3) float64 normals. The normals of the near-isotropic splats are
+    estimated from their nearest neighbors among the (N, 3) points instead.
+    """
+    normals, isotropic = get_covariance_normals(covariances, isotropy_threshold)
+    normals = normals.double().numpy()
+    isotropic_indices = np.flatnonzero(isotropic.numpy())
+    if isotropic_indices.size > 0:
+        normals[isotropic_indices] = estimate_knn_normals(points, isotropic_indices)
+
+    return normals
+
+
+def orient_normals_toward(normals, points, targets, chunk_size=KNN_NORMAL_CHUNK_SIZE):
+    """Flips the normals in place that face away from the closest of the (M, 3) target points."""
+    targets = torch.as_tensor(np.asarray(targets, dtype=np.float64).reshape(-1, 3))
+    for start in range(0, points.shape[0], chunk_size):
+        chunk_points = torch.from_numpy(points[start:start + chunk_size])
+        closest = torch.cdist(chunk_points, targets).argmin(dim=1)
+        directions = (targets[closest] - chunk_points).numpy()
+        flipped = np.einsum("ij,ij->i", normals[start:start + chunk_size], directions) < 0
+        normals[start:start + chunk_size][flipped] *= -1
+
+
+def convert_gs_to_open3d_pc(gaussian, normal_estimation=NormalEstimationType.Covariance, viewpoints=None,
+                            orient_to_centroid=False, isotropy_threshold=ISOTROPY_THRESHOLD):
+    """
+    Converts the Gaussian model to an Open3D point cloud with the colors and covariances of the splats.
+    By default, the normals are the shortest axes of the splats and the nearest neighbors are only searched for the
+    near-isotropic ones. The normals are oriented toward the closest viewpoint (e.g. the training cameras) or the
+    centroid of the points, if requested.
+    """
+    points = gaussian.get_xyz.double().detach().cpu().numpy()
     colors = sh2rgb(np.ascontiguousarray(gaussian.get_colors.double().detach().cpu().numpy()))
+    return create_gaussian_open3d_pc(points, colors, gaussian.get_full_covariance().detach().cpu(), normal_estimation,
+                                     viewpoints, orient_to_centroid, isotropy_threshold)
+
+
+def create_gaussian_open3d_pc(points, colors, covariances_tensor, normal_estimation=NormalEstimationType.Covariance,
+                              viewpoints=None, orient_to_centroid=False, isotropy_threshold=ISOTROPY_THRESHOLD):
+    """Builds the Open3D point cloud of splats from their float64 points and colors, see convert_gs_to_open3d_pc."""
+    o3d_pc = o3d.geometry.PointCloud()
+    o3d_pc.points = o3d.utility.Vector3dVector(points)
     o3d_pc.colors = o3d.utility.Vector3dVector(colors)
 
-    covariances_tensor = gaussian.get_full_covariance()
-    o3d_pc.covariances = o3d.utility.Matrix3dVector(covariances_tensor.double().detach().cpu().numpy())
+    if normal_estimation is NormalEstimationType.KNN:
+        # Open3D derives the normals from the covariances if there are any, so they are only set afterwards
+        o3d_pc.estimate_normals()
+        normals = np.asarray(o3d_pc.normals)
+    else:
+        normals = get_splat_normals(points, covariances_tensor, isotropy_threshold)
 
-    o3d_pc.estimate_normals()
-    # TODO: Find better way to approx normals
-    # normal_matrices = get_normals_from_covariance(covariances_tensor)
-    # o3d_pc.normals = o3d.utility.Vector3dVector(normal_matrices.double().detach().cpu().numpy())
-    # o3d_pc.orient_normals_consistent_tangent_plane(30)
+    if viewpoints is not None or orient_to_centroid:
+        targets = points.mean(axis=0) if viewpoints is None else viewpoints
+        orient_normals_toward(normals, points, targets)
+
+    o3d_pc.normals = o3d.utility.Vector3dVector(normals)
+    o3d_pc.covariances = o3d.utility.Matrix3dVector(covariances_tensor.double().numpy())
 
     return o3d_pc
+
+
+def to_open3d_tensor(tensor):
+    """Returns an Open3D tensor that shares the storage of the torch tensor (through DLPack, without a copy)."""
+    if tensor.is_cuda and not o3d.core.cuda.is_available():
+        # CPU-only builds of Open3D can not address the memory of the GPU
+        tensor = tensor.cpu()
+
+    return o3d.core.Tensor.from_dlpack(torch.utils.dlpack.to_dlpack(tensor.detach()))
+
+
+def to_torch_tensor(tensor):
+    """Returns a torch tensor that shares the storage of the Open3D tensor."""
+    return torch.utils.dlpack.from_dlpack(tensor.to_dlpack())
+
+
+def convert_gs_to_tensor_pc(gaussian, estimate_normals=True, normal_estimation=NormalEstimationType.Covariance,
+                            isotropy_threshold=ISOTROPY_THRESHOLD):
+    """
+    Exposes the splats as an Open3D tensor point cloud in float32. The positions share the storage of the model, so
+    the point cloud must not be modified in place (see transform_tensor_pc). The normals are estimated like in
+    convert_gs_to_open3d_pc, if requested.
+    """
+    points = gaussian.get_xyz.detach()
+    covariances = gaussian.get_full_covariance().detach()
+
+    o3d_pc = o3d.t.geometry.PointCloud()
+    o3d_pc.point.positions = to_open3d_tensor(points)
+    o3d_pc.point.colors = to_open3d_tensor(sh2rgb(gaussian.get_colors.detach()))
+
+    if estimate_normals and normal_estimation is NormalEstimationType.KNN:
+        # Like for the legacy point clouds, the normals are estimated before there are covariances to derive them from
+        o3d_pc.estimate_normals()
+
+    o3d_pc.point.covariances = to_open3d_tensor(covariances)
+
+    if estimate_normals and normal_estimation is not NormalEstimationType.KNN:
+        normals = get_splat_normals(points.cpu().numpy(), covariances.cpu(), isotropy_threshold)
+        o3d_pc.point.normals = to_open3d_tensor(torch.from_numpy(normals).to(points.device, torch.float))
+
+    return o3d_pc
+
+
+def convert_open3d_pc_to_tensor_pc(o3d_pc):
+    """Converts a legacy Open3D point cloud (e.g. a sparse input without a Gaussian model) to a float32 tensor one."""
+    return o3d.t.geometry.PointCloud.from_legacy(o3d_pc, o3d.core.float32)
+
+
+def select_tensor_pc(o3d_pc, indices):
+    """Returns a new tensor point cloud with copies of the attributes of the selected points."""
+    indices = torch.as_tensor(np.asarray(indices), dtype=torch.long)
+    selected_pc = o3d.t.geometry.PointCloud(o3d_pc.device)
+    for name in o3d_pc.point:
+        attribute = to_torch_tensor(o3d_pc.point[name])
+        selected_pc.point[name] = to_open3d_tensor(attribute[indices.to(attribute.device)])
+
+    return selected_pc
+
+
+def transform_tensor_pc(o3d_pc, transformation_matrix):
+    """
+    Returns a new tensor point cloud with transformed copies of the positions, normals and covariances. The other
+    attributes (e.g. the colors) are shared with the input point cloud.
+    """
+    transformation = torch.as_tensor(np.asarray(transformation_matrix), dtype=torch.float)
+    transformed_pc = o3d.t.geometry.PointCloud(o3d_pc.device)
+    for name in o3d_pc.point:
+        attribute = to_torch_tensor(o3d_pc.point[name])
+        rotation = transformation[:3, :3].to(attribute.device)
+        match name:
+            case "positions":
+                attribute = attribute @ rotation.T + transformation[:3, 3].to(attribute.device)
+            case "normals":
+                attribute = attribute @ rotation.T
+            case "covariances":
+                attribute = rotation @ attribute @ rotation.T
+
+        transformed_pc.point[name] = to_open3d_tensor(attribute)
+
+    return transformed_pc
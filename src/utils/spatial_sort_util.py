@@ -0,0 +1,36 @@
+"""
+Morton (Z-order) codes, used to sort the splats so that the ones close in space are close in memory as well
+"""
+
+import torch
+
+# Bits used for a single axis of the codes, three of them fit into an int64
+MORTON_BITS = 21
+
+
+def spread_bits(values):
+    """Inserts two zero bits after each of the lowest 21 bits of the int64 values."""
+    values = values & 0x1fffff
+    values = (values | (values << 32)) & 0x1f00000000ffff
+    values = (values | (values << 16)) & 0x1f0000ff0000ff
+    values = (values | (values << 8)) & 0x100f00f00f00f00f
+    values = (values | (values << 4)) & 0x10c30c30c30c30c3
+    values = (values | (values << 2)) & 0x1249249249249249
+    return values
+
+
+def get_morton_codes(points):
+    """Quantizes the (N, 3) points on the grid of their bounding box and interleaves the bits of the coordinates."""
+    if points.shape[0] == 0:
+        return torch.empty(0, dtype=torch.int64, device=points.device)
+
+    points = points.detach().double()
+    minimum = points.min(dim=0).values
+    extent = (points.max(dim=0).values - minimum).clamp(min=1e-12)
+    grid = ((points - minimum) / extent * ((1 << MORTON_BITS) - 1)).long()
+    return spread_bits(grid[:, 0]) | (spread_bits(grid[:, 1]) << 1) | (spread_bits(grid[:, 2]) << 2)
+
+
+def get_morton_order(points):
+    """Returns the permutation that sorts the points along the Z-order curve."""
+    return torch.argsort(get_morton_codes(points), stable=True)
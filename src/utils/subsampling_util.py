@@ -0,0 +1,49 @@
+import numpy as np
+
+# Bits used for a single axis of the packed voxel keys. Voxel indices outside of +-2^20 are clamped.
+VOXEL_INDEX_BITS = 21
+
+
+def get_voxel_keys(points, voxel_size):
+    """Packs the integer voxel coordinates of the points into a single int64 key per point."""
+    offset = 1 << (VOXEL_INDEX_BITS - 1)
+    voxel_indices = np.floor(points / voxel_size).astype(np.int64) + offset
+    np.clip(voxel_indices, 0, (1 << VOXEL_INDEX_BITS) - 1, out=voxel_indices)
+    return ((voxel_indices[:, 0] << (2 * VOXEL_INDEX_BITS)) | (voxel_indices[:, 1] << VOXEL_INDEX_BITS) |
+            voxel_indices[:, 2])
+
+
+class StreamingSubsampler:
+    """
+    Subsamples a point cloud that is read chunk by chunk.
+    The stride filter keeps every n-th point of the whole stream, the opacity filter drops points below the
+    threshold, and the voxel filter keeps the first point that falls into each voxel. Only the keys of the
+    occupied voxels are kept between the chunks.
+    """
+
+    def __init__(self, stride=1, voxel_size=0.0, min_opacity=0.0):
+        self.stride = max(int(stride), 1)
+        self.voxel_size = voxel_size
+        self.min_opacity = min_opacity
+
+        self._point_offset = 0
+        self._occupied_voxels = np.empty(0, dtype=np.int64)
+
+    def select(self, points, opacities=None):
+        """Returns the indices of the points of the chunk that are kept."""
+        point_count = points.shape[0]
+        first_index = (-self._point_offset) % self.stride
+        self._point_offset += point_count
+
+        indices = np.arange(first_index, point_count, self.stride)
+        if opacities is not None and self.min_opacity > 0.0:
+            indices = indices[opacities[indices] >= self.min_opacity]
+
+        if self.voxel_size > 0.0 and indices.size > 0:
+            keys = get_voxel_keys(points[indices], self.voxel_size)
+            unique_keys, first_occurrences = np.unique(keys, return_index=True)
+            is_new = ~np.isin(unique_keys, self._occupied_voxels, assume_unique=True)
+            indices = np.sort(indices[first_occurrences[is_new]])
+            self._occupied_voxels = np.union1d(self._occupied_voxels, unique_keys[is_new])
+
+        return indices